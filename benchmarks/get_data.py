@@ -0,0 +1,42 @@
+"""
+Compares the fixed-width IMU reader with the ``np.loadtxt`` parser.
+
+Run from the repository root:
+
+    python -m benchmarks.get_data [number of records]
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.synthetic import write_imu_file
+from utils import get_data_np
+
+
+def timed(func, *args):
+    t0 = datetime.now()
+    result = func(*args)
+    return result, (datetime.now() - t0).total_seconds()
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    cols = list(range(2, 8))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        file_path = write_imu_file(os.path.join(tmp, 'flight.dat'), n)
+
+        fixed, t_fixed = timed(get_data_np.get_data, file_path, cols)
+        text, t_text = timed(get_data_np._get_data_loadtxt, file_path, cols)
+        _, t_nz = timed(get_data_np.get_data, file_path, [7])
+
+    for a, b in zip(fixed, text):
+        assert np.array_equal(a.astype('float64'), b.astype('float64'))
+
+    print(f'{n} records, columns {cols}')
+    print(f'\tnp.loadtxt:  {t_text:8.3f} s')
+    print(f'\tfixed-width: {t_fixed:8.3f} s  ({t_text / t_fixed:.1f}x)')
+    print(f'\tfixed-width, column 7 only: {t_nz:8.3f} s')
@@ -0,0 +1,128 @@
+"""
+Compares the vectorized level crossing count with the per-cycle loop it
+replaced, including values lying exactly on level borders, and the count
+straight from the reversals with the one from the rainflow cycles.
+
+Run from the repository root:
+
+    python -m benchmarks.level_crossing [number of samples]
+"""
+import sys
+from datetime import datetime
+from math import ceil, floor
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_nz
+from utils import level_crossing, rainflow_kernel
+from utils.cycle_table import CycleTable
+
+
+def loop_level_cross_count(cycles, level_width, base_g=1.):
+    """The per-cycle implementation of ``level_cross_count``."""
+    counts, peaks, valleys = cycles.count, cycles.peak, cycles.valley
+
+    max_signal = max(peaks)
+    min_signal = min(valleys)
+
+    if (max_signal - base_g) % level_width != 0.0:
+        top_intervals = ceil((max_signal - base_g) / level_width)
+    else:
+        top_intervals = ceil((max_signal - base_g) / level_width) + 1
+    if (min_signal - base_g) % level_width != 0.0:
+        bottom_intervals = int(abs(floor((min_signal - base_g) / level_width)))
+    else:
+        bottom_intervals = int(
+            abs(floor((min_signal - base_g) / level_width))) + 1
+
+    top_counts = np.zeros(top_intervals)
+    bottom_counts = np.zeros(bottom_intervals)
+    top_bins = [round(base_g + level_width * (2 * i + 1) / 2, 5) for i in
+                range(top_intervals)]
+    bottom_bins = [round(base_g - level_width * (2 * i + 1) / 2, 5) for i in
+                   range(bottom_intervals)]
+
+    for n, peak, valley in zip(counts, peaks, valleys):
+        for value in (peak, valley):
+            if value >= base_g:
+                i = 0
+                while value >= base_g + i * level_width:
+                    i += 1
+                top_counts[:i] += n
+            else:
+                i = 0
+                while value <= base_g - i * level_width:
+                    i += 1
+                bottom_counts[:i] += n
+
+    return top_bins, bottom_bins, top_counts, bottom_counts
+
+
+def check(cycles, level_width):
+    expected = loop_level_cross_count(cycles, level_width)
+    result = level_crossing.level_cross_count(cycles, level_width)
+    assert expected[:2] == result[:2]
+    for a, b in zip(expected[2:], result[2:]):
+        assert np.array_equal(a, b)
+
+
+def check_reversals(signal, level_width):
+    """The count from the reversals equals the one from the cycle table of
+    the rainflow path, whose peaks and valleys are exact."""
+    expected = rainflow_cross_count(signal, level_width)
+    result = level_crossing.reversal_cross_count(signal, level_width)
+    assert expected[:2] == result[:2]
+    for a, b in zip(expected[2:], result[2:]):
+        assert np.array_equal(a, b)
+
+
+def rainflow_cross_count(signal, level_width):
+    return level_crossing.level_cross_count(CycleTable.from_cycles(
+        rainflow_kernel.extract_cycles(signal)), level_width)
+
+
+def timed(func, *args):
+    t0 = datetime.now()
+    func(*args)
+    return (datetime.now() - t0).total_seconds()
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    cycles = CycleTable.from_cycles(
+        rainflow_kernel.extract_cycles(synthetic_nz(n)))
+
+    # peaks and valleys on the borders of .25 g levels, the baseline
+    # included, and at the extremes of the signal
+    borders = 1. + .25 * np.array([-4., 4., -1., 0., 2., 0., 4., -4.])
+    on_borders = CycleTable.from_cycles(
+        rainflow_kernel.extract_cycles(borders))
+    for level_width in (.25, .5, .125, .1):
+        check(on_borders, level_width)
+        check_reversals(borders, level_width)
+    print('Counts on level borders are identical.')
+
+    print(f'{n} samples, {len(cycles)} cycles')
+    for level_width in (.1, .01, .002):
+        check(cycles, level_width)
+        t_loop = timed(loop_level_cross_count, cycles, level_width)
+        t_vector = timed(level_crossing.level_cross_count, cycles,
+                         level_width)
+        print(f'level width {level_width} g, identical results')
+        print(f'\tloop:       {t_loop:8.3f} s')
+        print(f'\tvectorized: {t_vector:8.3f} s  '
+              f'({t_loop / t_vector:.0f}x)')
+
+    # rounded to the 6 decimals of the IMU files, so that many peaks and
+    # valleys lie exactly on the borders of fine levels
+    signal = np.round(synthetic_nz(n), 6)
+    print('from the reversals, without counting cycles')
+    for level_width in (.1, .01, .002):
+        check_reversals(signal, level_width)
+        t_cycles = timed(rainflow_cross_count, signal, level_width)
+        t_reversals = timed(level_crossing.reversal_cross_count, signal,
+                            level_width)
+        print(f'level width {level_width} g, identical results')
+        print(f'\trainflow + level crossing: {t_cycles:8.3f} s')
+        print(f'\treversals:                 {t_reversals:8.3f} s  '
+              f'({t_cycles / t_reversals:.0f}x)')
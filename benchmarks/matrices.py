@@ -0,0 +1,144 @@
+"""
+Compares the single pass mean-range and from-to matrices with the
+per-cycle loops they replaced, including values lying exactly on bin
+edges, and the cycles-to-failure of the matrix cells computed at once with
+the per-cell loop of ``damage``. Also compares the memory of the dense and
+sparse matrices.
+
+Run from the repository root:
+
+    python -m benchmarks.matrices [number of samples]
+"""
+import sys
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_nz
+from utils import material_lib, matrices, rainflow_kernel
+from utils.cycle_table import CycleTable
+
+
+def loop_matrix(row_values, col_values, counts, row_bin_size,
+                col_bin_size):
+    """The per-cycle implementation of the matrices."""
+    row_edges = np.arange(np.floor(np.amin(row_values)),
+                          np.ceil(np.amax(row_values)) + row_bin_size,
+                          row_bin_size)
+    col_edges = np.arange(np.floor(np.amin(col_values)),
+                          np.ceil(np.amax(col_values)) + col_bin_size,
+                          col_bin_size)
+
+    matrix = np.zeros((len(row_edges) - 1, len(col_edges) - 1))
+    r = np.digitize(row_values, row_edges, right=True) - 1
+    c = np.digitize(col_values, col_edges, right=True) - 1
+    for i in range(len(counts)):
+        matrix[r[i], c[i]] += counts[i]
+
+    return matrix
+
+
+def loop_mean_range_matrix(cycles, mean_bin_size, range_bin_size):
+    return loop_matrix(cycles.range, cycles.mean, cycles.count,
+                       range_bin_size, mean_bin_size)
+
+
+def loop_from_to(cycles, from_bin_size, to_bin_size):
+    return loop_matrix(cycles.valley, cycles.peak, cycles.count,
+                       to_bin_size, from_bin_size)
+
+
+def loop_cycles_to_failure(mean_bins, range_bins, properties):
+    """The per-cell implementation of the life table of ``damage``."""
+    a, b, c, d = properties
+    N_matrix = np.zeros((len(range_bins), len(mean_bins)))
+    for i in range(N_matrix.shape[0]):
+        for j in range(N_matrix.shape[1]):
+            s_max = (mean_bins[j] + range_bins[i] / 2) * 200
+            s_min = (mean_bins[j] - range_bins[i] / 2) * 200
+            r = s_min / s_max
+            s_eq = s_max * (1 - r) ** d
+            N_matrix[i, j] = 10 ** (a - b * np.log(s_eq - c))
+    return N_matrix
+
+
+def check(cycles, bin_sizes):
+    for loop, vectorized in ((loop_mean_range_matrix,
+                              matrices.mean_range_matrix),
+                             (loop_from_to, matrices.from_to)):
+        expected = loop(cycles, *bin_sizes)
+        result = vectorized(cycles, *bin_sizes)
+        assert expected.shape == result.shape
+        assert np.array_equal(expected, result)
+        assert np.array_equal(
+            vectorized(cycles, *bin_sizes, sparse=True).toarray(), expected)
+
+
+def timed(func, *args):
+    return timed_result(func, *args)[1]
+
+
+def timed_result(func, *args, **kwargs):
+    t0 = datetime.now()
+    result = func(*args, **kwargs)
+    return result, (datetime.now() - t0).total_seconds()
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    cycles = CycleTable.from_cycles(
+        rainflow_kernel.extract_cycles(synthetic_nz(n)))
+
+    # means, ranges, peaks and valleys on the edges of .25 g bins, the
+    # lowest edges included
+    on_edges = CycleTable.from_cycles(rainflow_kernel.extract_cycles(
+        1. + .25 * np.array([-4., 4., -1., 0., 2., 0., 4., -4.])))
+    for bin_sizes in ((.25, .25), (.5, .25), (.1, .1)):
+        check(on_edges, bin_sizes)
+    print('Counts on bin edges are identical.')
+
+    print(f'{n} samples, {len(cycles)} cycles')
+    for bin_sizes in ((.5, 1.), (.1, .1), (.01, .01)):
+        check(cycles, bin_sizes)
+        print(f'bin sizes {bin_sizes} g, identical results')
+        for name, loop, vectorized in (
+                ('mean-range', loop_mean_range_matrix,
+                 matrices.mean_range_matrix),
+                ('from-to', loop_from_to, matrices.from_to)):
+            t_loop = timed(loop, cycles, *bin_sizes)
+            t_vector = timed(vectorized, cycles, *bin_sizes)
+            print(f'\t{name + ":":12s} loop {t_loop:8.3f} s, '
+                  f'single pass {t_vector:8.3f} s  '
+                  f'({t_loop / t_vector:.0f}x)')
+
+    print('dense and sparse mean-range matrices')
+    for bin_sizes in ((.1, .1), (.01, .01), (.002, .002)):
+        dense, t_dense = timed_result(matrices.mean_range_matrix, cycles,
+                                      *bin_sizes)
+        sparse, t_sparse = timed_result(matrices.mean_range_matrix, cycles,
+                                        *bin_sizes, sparse=True)
+        assert np.array_equal(sparse.toarray(), dense)
+        print(f'bin sizes {bin_sizes} g, {sparse.nnz} of {dense.size} '
+              f'cells occupied')
+        print(f'\tdense  {dense.nbytes / 1024:10.1f} KiB {t_dense:8.3f} s')
+        print(f'\tsparse {sparse.nbytes / 1024:10.1f} KiB {t_sparse:8.3f} s')
+
+    # the vectorized log and power may differ from the scalar ones in the
+    # last bits, amplified by the power of ten near the endurance limit
+    properties = material_lib.load_material_lib(
+        'lib/mat_lib.json')['2024-T3 Aluminium']['2.0, Sheet, Longitudinal']
+    print('cycles-to-failure of the mean-range cells')
+    with np.errstate(all='ignore'):
+        for bin_sizes in ((.5, 1.), (.1, .1), (.01, .01)):
+            m_r_matrix = matrices.MeanRangeMatrix.from_cycles(cycles,
+                                                              *bin_sizes)
+            args = (m_r_matrix.mean_bins, m_r_matrix.range_bins, properties)
+            expected = loop_cycles_to_failure(*args)
+            assert np.allclose(matrices.cycles_to_failure(*args), expected,
+                               rtol=1e-10, equal_nan=True)
+            t_loop = timed(loop_cycles_to_failure, *args)
+            t_vector = timed(matrices.cycles_to_failure, *args)
+            print(f'bin sizes {bin_sizes} g, {m_r_matrix.counts.size} cells')
+            print(f'\tloop {t_loop * 1e3:8.2f} ms, '
+                  f'broadcast {t_vector * 1e3:8.2f} ms  '
+                  f'({t_loop / t_vector:.0f}x)')
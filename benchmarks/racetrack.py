@@ -0,0 +1,59 @@
+"""
+Compares the in-project racetrack filter with
+``fatpack.find_reversals_racetrack_filtered``, on the whole signal and fed
+in chunks, also for signals recorded with few decimals, whose reversals are
+often half a racetrack from its position.
+
+Run from the repository root:
+
+    python -m benchmarks.racetrack [number of samples]
+"""
+import sys
+from datetime import datetime
+
+import fatpack
+import numpy as np
+
+from benchmarks.synthetic import synthetic_nz
+from utils import racetrack
+
+
+def timed(func, *args, **kwargs):
+    t0 = datetime.now()
+    result = func(*args, **kwargs)
+    return result, (datetime.now() - t0).total_seconds()
+
+
+def chunked(signal, h, k, chunk_size):
+    """Filtered reversals of the signal fed in chunks."""
+    f = racetrack.RacetrackFilter(h, k, signal.min(), signal.max())
+    parts = [f.update(signal[i:i + chunk_size])
+             for i in range(0, len(signal), chunk_size)]
+    parts.append(f.finalize())
+    return [np.concatenate(p) for p in zip(*parts)]
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    for decimals, h in ((None, .05), (None, .1), (None, .2), (6, .1),
+                        (2, .1)):
+        signal = synthetic_nz(n)
+        if decimals is not None:
+            signal = np.round(signal, decimals)
+
+        expected, t_fatpack = timed(
+            fatpack.find_reversals_racetrack_filtered, signal, h=h, k=200)
+        whole, t_whole = timed(
+            racetrack.find_reversals_racetrack_filtered, signal, h=h, k=200)
+        parts, t_chunked = timed(chunked, signal, h, 200, 50_000)
+
+        for values, indices in (whole, parts):
+            assert np.array_equal(values, expected[0])
+            assert np.array_equal(indices, expected[1])
+
+        print(f'{n} samples, {decimals or "all"} decimals, k = 200, '
+              f'h = {h}: {len(expected[0])} reversals, identical results')
+        print(f'\tfatpack:                  {t_fatpack:8.3f} s')
+        print(f'\tracetrack, whole signal:  {t_whole:8.3f} s')
+        print(f'\tracetrack, 50k chunks:    {t_chunked:8.3f} s')
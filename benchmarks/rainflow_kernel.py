@@ -0,0 +1,93 @@
+"""
+Validates the in-project rainflow kernel against the ASTM E1049-85 example
+(see ``archive/ASTM_example.py``) and the ``rainflow`` package, and compares
+their speed. The incremental counter is checked against a count of the
+whole signal.
+
+Run from the repository root:
+
+    python -m benchmarks.rainflow_kernel [number of samples]
+"""
+import sys
+from collections import Counter
+from datetime import datetime
+
+import numpy as np
+import rainflow
+
+from benchmarks.synthetic import synthetic_nz
+from utils import rainflow_kernel
+
+# ASTM E1049-85, Fig. 6 (a) and the resulting counts, range: cycles
+ASTM_SIGNAL = np.array([-2., 1., -3., 5., -1., 3., -4., 4., -2.])
+ASTM_COUNTS = {3.: .5, 4.: 1.5, 6.: .5, 8.: 1., 9.: .5}
+
+# the digitized signal of archive/ASTM_example.py
+ARCHIVE_SIGNAL = np.array([-1.951672862, 0.789962825, -2.778810409,
+                           4.823420074, -0.94795539, 2.79739777,
+                           -3.847583643, 3.884758364, -2.100371747]) - .0743
+
+
+def package_cycles(signal):
+    """Cycles of ``rainflow.extract_cycles`` the way ``RainFlowCounter``
+    collected them before the kernel."""
+    cyc = {'range': [], 'mean': [], 'count': [], 'start': [], 'end': []}
+    for rg, mn, c, i_s, i_e in rainflow.extract_cycles(signal):
+        cyc['range'].append(rg)
+        cyc['mean'].append(mn)
+        cyc['count'].append(c)
+        cyc['start'].append(i_s)
+        cyc['end'].append(i_e)
+    return {k: np.array(v) for k, v in cyc.items()}
+
+
+def check(signal):
+    expected = package_cycles(signal)
+    cycles = rainflow_kernel.extract_cycles(signal)
+    for name, column in expected.items():
+        assert np.array_equal(cycles[name], column), name
+
+
+def incremental_cycles(signal, chunk_size):
+    """Cycles of the signal fed to an ``IncrementalCounter`` in chunks."""
+    counter = rainflow_kernel.IncrementalCounter()
+    parts = [counter.update(signal[i:i + chunk_size])
+             for i in range(0, len(signal), chunk_size)]
+    parts.append(counter.finalize())
+    return np.concatenate(parts)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+
+    counts = Counter()
+    for c in rainflow_kernel.extract_cycles(ASTM_SIGNAL):
+        counts[c['range']] += c['count']
+    assert counts == ASTM_COUNTS, counts
+    check(ARCHIVE_SIGNAL)
+    for chunk_size in (1, 2, 3):
+        assert np.array_equal(incremental_cycles(ASTM_SIGNAL, chunk_size),
+                              rainflow_kernel.extract_cycles(ASTM_SIGNAL))
+    print('ASTM E1049-85 example reproduced.')
+
+    signal = synthetic_nz(n)
+    check(signal)
+
+    t0 = datetime.now()
+    package_cycles(signal)
+    t_package = (datetime.now() - t0).total_seconds()
+
+    t0 = datetime.now()
+    cycles = rainflow_kernel.extract_cycles(signal)
+    t_kernel = (datetime.now() - t0).total_seconds()
+
+    t0 = datetime.now()
+    chunked = incremental_cycles(signal, 50_000)
+    t_incremental = (datetime.now() - t0).total_seconds()
+    assert np.array_equal(chunked, cycles)
+
+    print(f'{n} samples, {len(cycles)} cycles, identical results')
+    print(f'\trainflow.extract_cycles: {t_package:8.3f} s')
+    print(f'\trainflow_kernel:         {t_kernel:8.3f} s  '
+          f'({t_package / t_kernel:.1f}x)')
+    print(f'\tincremental, 50k chunks: {t_incremental:8.3f} s')
@@ -0,0 +1,129 @@
+"""
+Builds fleet matrices and g-exceedance curves from the summary store and
+compares them with the ones of all the cycles of the fleet, at coarse and
+fine resolutions, then checks that the level crossing queries take the
+same time for longer flights.
+
+Run from the repository root:
+
+    python -m benchmarks.summary_store [number of flights]
+"""
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_nz
+from utils import level_crossing, matrices, rainflow_kernel
+from utils.cycle_table import CycleTable
+from utils.exceedance import Exceedance
+from utils.summary_store import SummaryStore, summarize
+
+# samples of each synthetic flight
+SAMPLES = 50_000
+
+# mean, range and from-to bin sizes and level width of each resolution; the
+# bin sizes are exact in binary, or the values are not on their edges
+RESOLUTIONS = ((.25, .5, .25, .05), (.002, .002, .002, .002))
+
+# flights and samples per flight of the flight length check
+LENGTH_FLIGHTS = 20
+LENGTHS = (SAMPLES, 4 * SAMPLES, 16 * SAMPLES)
+
+
+def timed(func, *args, **kwargs):
+    t0 = datetime.now()
+    result = func(*args, **kwargs)
+    return result, (datetime.now() - t0).total_seconds()
+
+
+def best_of(func, repeat=5):
+    """Shortest of ``repeat`` runs of ``func``, in seconds."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def fleet(n, samples=SAMPLES):
+    """Cycle tables of ``n`` synthetic flights."""
+    return [CycleTable.from_cycles(rainflow_kernel.extract_cycles(
+        synthetic_nz(samples, seed=i))) for i in range(n)]
+
+
+def fill(directory, flights):
+    """Writes the summaries of the flights into a new store."""
+    with SummaryStore(directory) as store:
+        for i, cycles in enumerate(flights):
+            store.add(summarize(f'f{i}.dat', f'{i:032x}', {},
+                                Exceedance.from_cycles(cycles), cycles,
+                                duration=SAMPLES / 100.))
+    return SummaryStore(directory)
+
+
+def from_cycles(flights, mean_bin, range_bin, ft_bin, level_width):
+    """Fleet matrices and curve from all the cycles."""
+    cycles = CycleTable(np.concatenate([c.data for c in flights]))
+    return (matrices.mean_range_matrix(cycles, mean_bin, range_bin),
+            matrices.from_to(cycles, ft_bin, ft_bin),
+            level_crossing.level_cross_count(cycles, level_width))
+
+
+def from_store(store, rows, mean_bin, range_bin, ft_bin, level_width):
+    """Fleet matrices and curve from the summaries."""
+    return (store.mean_range_matrix(mean_bin, range_bin, rows),
+            store.from_to_matrix(ft_bin, ft_bin, rows),
+            store.level_crossings(level_width, rows))
+
+
+def check(expected, result):
+    for a, b in zip(expected[:2], result[:2]):
+        assert a.shape == b.shape and np.array_equal(a, b)
+    assert expected[2][:2] == result[2][:2]
+    for a, b in zip(expected[2][2:], result[2][2:]):
+        assert np.array_equal(a, b)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    flights = fleet(n)
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = fill(directory, flights)
+
+        print(f'{n} flights of {SAMPLES} samples')
+        for resolution in RESOLUTIONS:
+            print(f'bin sizes and level width {resolution} g')
+            for name, subset in (('fleet', slice(None)),
+                                 ('half', slice(None, None, 2)),
+                                 ('tenth', slice(None, None, 10))):
+                names = [f'f{i}.dat' for i in range(n)][subset]
+                expected, t_cycles = timed(from_cycles, flights[subset],
+                                           *resolution)
+                rows = store.select(file_names=names)
+                result, t_store = timed(from_store, store, rows,
+                                        *resolution)
+                check(expected, result)
+
+                print(f'{name}: {len(rows)} flights, identical results')
+                print(f'\tall the cycles: {t_cycles * 1e3:8.1f} ms')
+                print(f'\tsummaries:      {t_store * 1e3:8.1f} ms')
+
+    # the level crossing histogram of a record is on the fine grid, so its
+    # size and the query time do not grow with the length of the flights
+    print(f'level crossings of {LENGTH_FLIGHTS} flights at .002 g')
+    times = []
+    for samples in LENGTHS:
+        with tempfile.TemporaryDirectory() as directory:
+            store = fill(directory, fleet(LENGTH_FLIGHTS, samples))
+            times.append(best_of(lambda: store.level_crossings(.002)))
+            t_matrix = best_of(lambda: store.mean_range_matrix(.002, .002))
+            bins = len(store.columns['exc_bins']) / LENGTH_FLIGHTS
+        print(f'{samples} samples: {bins:8.0f} bins per flight')
+        print(f'\tlevel crossings:   {times[-1] * 1e3:8.1f} ms')
+        print(f'\tmean-range matrix: {t_matrix * 1e3:8.1f} ms')
+    assert max(times) < 3 * times[0]
@@ -0,0 +1,54 @@
+"""
+Generates synthetic IMU files with the same fixed-width layout as the
+recorder output, for benchmarking the data pipeline without the
+proprietary flight data.
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+
+# number of numeric fields between the timestamp and the trailing flag
+N_FIELDS = 11
+
+
+def synthetic_nz(n: int, seed: int = 0) -> np.ndarray:
+    """
+    A vertical acceleration like signal around 1g: slow manoeuvres plus
+    turbulence.
+
+    :param n: number of samples
+    :param seed: random seed
+    :return: Nz values
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(n) / 100.
+    return (1. + .3 * np.sin(2 * np.pi * t / 60.)
+            + .15 * np.cumsum(rng.normal(0., .02, n)) / np.sqrt(n / 1e4)
+            + rng.normal(0., .05, n))
+
+
+def write_imu_file(file_path: str, n: int, seed: int = 0,
+                   start: datetime = datetime(2021, 9, 24, 6, 34)) -> str:
+    """
+    Writes ``n`` records of 151 characters plus a CRLF line break, like the
+    recorder does. Columns are date, time, 11 numeric fields (Nz is column
+    7) and a constant flag.
+
+    :param file_path: output file
+    :param n: number of records
+    :param seed: random seed
+    :param start: timestamp of the first record
+    :return: ``file_path``
+    """
+    rng = np.random.default_rng(seed)
+    fields = rng.normal(0., 5., (n, N_FIELDS))
+    fields[:, 5] = synthetic_nz(n, seed)
+
+    step = timedelta(milliseconds=10)
+    with open(file_path, 'w', newline='\r\n') as f:
+        for i in range(n):
+            stamp = (start + i * step).strftime('%d-%m-%Y %H:%M:%S.%f')
+            f.write('%s0  %s 4\n' % (
+                stamp, ' '.join(f'{v:10.6f}' for v in fields[i])))
+
+    return file_path
@@ -1,7 +1,8 @@
 from utils import rf_counter
 
-all_flights = rf_counter.MultipleFlights(verbose=True)
+if __name__ == '__main__':  # required by the worker processes
+    all_flights = rf_counter.MultipleFlights(verbose=True)
 
-all_flights.g_exc_curve(save_figure=False)
+    all_flights.g_exc_curve(save_figure=False)
 
-# input('Press ENTER to close...')
+    # input('Press ENTER to close...')
@@ -2,6 +2,7 @@ import datetime
 import logging
 import os
 
+from utils.get_data_np import complete_length
 from utils.loggers import MyLog
 
 
@@ -12,26 +13,9 @@ def truncate_end(fl):
     :param fl: input file which must have writing permissions.
     :return: None
     """
-    # go to end and track back a 154-char line. If it doesn't land on an
-    # end-of-line char, trace the last EOL char and truncate from there
-    fl.seek(0, os.SEEK_END)  # go to last byte of the file
-    ll = fl.tell()
-    fl.seek(ll - 154, os.SEEK_SET)  # go 154 chars back
-    temp_str = fl.read(2)  # read 2 chars from there
-
-    if '\n' in temp_str:
-        pass
-    else:
-        fl.seek(0, os.SEEK_END)
-        pos = fl.tell() - 2
-        ts = fl.read(1)
-        while ts != '\n':
-            pos -= 1
-            fl.seek(pos, os.SEEK_SET)
-            ts = fl.read(1)
-
-        fl.seek(pos, os.SEEK_SET)
-        fl.truncate()
+    # the complete records end at a whole multiple of the record length
+    fl.flush()
+    fl.truncate(complete_length(fl.name))
 
 
 # logger
@@ -0,0 +1,190 @@
+"""
+SQLite catalog of the IMU files of a directory.
+
+A scan stores the metadata of every IMU file: its size and modification
+time, a content digest, the number of records, the first and last
+timestamps, the duration and whether the file is a valid IMU recording.
+Only new or changed files are opened by later scans. Flights can then be
+selected by date or duration and invalid files skipped without touching
+the files themselves.
+
+The catalog is a local file, outside the scanned directory, which may be a
+read-only or network mount. By default it is kept in the cache directory
+of the user, ``CATALOG_DIR``, which the system does not clear: a lost
+catalog would make the next scan read and hash every file again.
+"""
+import hashlib
+import os
+import sqlite3
+
+import numpy as np
+
+from utils import get_data_np, stage_cache
+
+# default local directory of the catalogs, one per scanned directory, in
+# the cache directory of the user: %LOCALAPPDATA% on Windows,
+# $XDG_CACHE_HOME or ~/.cache elsewhere
+if os.name == 'nt':
+    _USER_CACHE = os.environ.get('LOCALAPPDATA') or os.path.expanduser(
+        os.path.join('~', 'AppData', 'Local'))
+else:
+    _USER_CACHE = os.environ.get('XDG_CACHE_HOME') or os.path.expanduser(
+        os.path.join('~', '.cache'))
+CATALOG_DIR = os.path.join(_USER_CACHE, 'fatigue_load_spectrum', 'catalogs')
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS flights (
+    file_name  TEXT PRIMARY KEY,
+    size       INTEGER NOT NULL,
+    mtime_ns   INTEGER NOT NULL,
+    digest     TEXT NOT NULL,
+    records    INTEGER,
+    first_time TEXT,
+    last_time  TEXT,
+    duration   REAL,
+    valid      INTEGER NOT NULL,
+    error      TEXT
+)'''
+
+
+class FlightCatalog:
+    def __init__(self, directory, db_path=None):
+        """
+        Opens, or creates, the catalog of the IMU files in ``directory``.
+
+        :param directory: str Directory containing the IMU files.
+        :param db_path: str Path to the SQLite file. Defaults to the
+         ``catalog_path`` of ``directory`` in ``CATALOG_DIR``.
+        """
+        self.directory = directory
+        self.db_path = db_path or catalog_path(directory)
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)),
+                    exist_ok=True)
+        self.connection = sqlite3.connect(self.db_path)
+        self.connection.execute(_SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def scan(self) -> int:
+        """
+        Brings the catalog up to date with the directory. Files whose size
+        and modification time are unchanged are not opened; entries of
+        deleted files are removed.
+
+        :return: the number of files (re)cataloged.
+        """
+        known = {name: (size, mtime_ns) for name, size, mtime_ns in
+                 self.connection.execute(
+                     'SELECT file_name, size, mtime_ns FROM flights')}
+
+        present = set()
+        updated = 0
+        for file_name in sorted(os.listdir(self.directory)):
+            if not get_data_np.is_imu_file(file_name):
+                continue
+            present.add(file_name)
+
+            stat = os.stat(os.path.join(self.directory, file_name))
+            if known.get(file_name) == (stat.st_size, stat.st_mtime_ns):
+                continue
+
+            self.connection.execute(
+                'INSERT OR REPLACE INTO flights VALUES '
+                '(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                self._describe(file_name))
+            updated += 1
+
+        for file_name in set(known) - present:
+            self.connection.execute(
+                'DELETE FROM flights WHERE file_name = ?', (file_name,))
+        self.connection.commit()
+
+        return updated
+
+    def select(self, start=None, end=None,
+               min_duration=None, max_duration=None,
+               valid=True) -> list:
+        """
+        Queries the catalog for flights.
+
+        :param start: Earliest first timestamp, e.g. ``'2021-10-01'``.
+        :param end: Latest first timestamp, exclusive.
+        :param min_duration: float Shortest duration in seconds.
+        :param max_duration: float Longest duration in seconds.
+        :param valid: bool Select valid files only, or invalid ones only if
+         ``False``. Select both if ``None``.
+        :return: the matching file names, in chronological order.
+        """
+        clauses, params = [], []
+        if valid is not None:
+            clauses.append('valid = ?')
+            params.append(int(valid))
+        if start is not None:
+            clauses.append('first_time >= ?')
+            params.append(_iso(start))
+        if end is not None:
+            clauses.append('first_time < ?')
+            params.append(_iso(end))
+        if min_duration is not None:
+            clauses.append('duration >= ?')
+            params.append(min_duration)
+        if max_duration is not None:
+            clauses.append('duration <= ?')
+            params.append(max_duration)
+
+        where = ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+        rows = self.connection.execute(
+            'SELECT file_name FROM flights' + where +
+            ' ORDER BY first_time, file_name', params)
+        return [row[0] for row in rows]
+
+    def _describe(self, file_name) -> tuple:
+        """
+        Reads the metadata of an IMU file into a row of the catalog.
+        """
+        file_path = os.path.join(self.directory, file_name)
+        stat = os.stat(file_path)
+        size, mtime_ns = stat.st_size, stat.st_mtime_ns
+        # the same digest as the stage cache and the summary store
+        digest = stage_cache.content_hash(file_path)
+
+        records = first = last = duration = None
+        error = None
+        try:
+            # same test as `MultipleFlights`: a 152-character first line
+            with get_data_np.open_imu(file_path, 'rt') as f:
+                if len(f.readline()) != 152:
+                    raise ValueError('the first line is not 152 characters')
+            records, first, last = get_data_np.time_span(file_path)
+            duration = (last - first) / np.timedelta64(1, 's')
+            first, last = str(first), str(last)
+        except Exception as err:  # any unreadable file is invalid
+            error = str(err)
+
+        return (file_name, size, mtime_ns, digest, records, first, last,
+                duration, int(error is None), error)
+
+
+def catalog_path(directory: str, catalog_dir: str = CATALOG_DIR) -> str:
+    """
+    Path to the catalog of a directory, named after its absolute path.
+
+    :param directory: directory containing the IMU files
+    :param catalog_dir: local directory of the catalogs
+    :return: path to the SQLite file
+    """
+    key = hashlib.blake2b(os.path.abspath(directory).encode(),
+                          digest_size=16).hexdigest()
+    return os.path.join(catalog_dir, key + '.sqlite')
+
+
+def _iso(timestamp) -> str:
+    """Formats a date or a timestamp the way it is stored in the catalog."""
+    return str(np.datetime64(timestamp, 'us'))
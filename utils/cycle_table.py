@@ -0,0 +1,93 @@
+"""
+Compact table of the cycles extracted by rainflow counting.
+"""
+import numpy as np
+
+# exact peak and valley values, full cycle flag (0 for half cycles)
+_DTYPE = np.dtype([('peak', 'f8'), ('valley', 'f8'), ('full', 'i1')])
+
+# as above plus the signal indices of the start and end of the cycles
+_DTYPE_INDEXED = np.dtype(_DTYPE.descr + [('start', 'i4'), ('end', 'i4')])
+
+
+class CycleTable:
+    """
+    Cycles of a flight backed by a single structured array: 17 bytes per
+    cycle, or 25 with the start and end indices, instead of 40 for an
+    ``(n, 5)`` float64 matrix of mean, range, count, peak and valley.
+
+    The columns are exposed by name. ``peak`` and ``valley`` are views of
+    the table, holding the reversal values exactly; ``mean``, ``range`` and
+    ``count`` are derived from it, computed as in
+    ``rainflow_kernel.extract_cycles`` so they are identical too.
+    """
+
+    __slots__ = ('data',)
+
+    def __init__(self, data: np.ndarray):
+        self.data = data
+
+    @classmethod
+    def from_cycles(cls, cycles: np.ndarray, indices: bool = False):
+        """
+        Builds the table from the output of
+        ``rainflow_kernel.extract_cycles``.
+
+        :param cycles: structured array of ``rainflow_kernel.CYCLE_DTYPE``
+        :param indices: keep the start and end indices of the cycles
+        :return: CycleTable
+        """
+        data = np.empty(len(cycles), dtype=_DTYPE_INDEXED if indices
+                        else _DTYPE)
+        data['peak'] = cycles['peak']
+        data['valley'] = cycles['valley']
+        data['full'] = cycles['count'] == 1.
+        if indices:
+            data['start'] = cycles['start']
+            data['end'] = cycles['end']
+        return cls(data)
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, item):
+        return CycleTable(np.atleast_1d(self.data[item]))
+
+    @property
+    def nbytes(self) -> int:
+        return self.data.nbytes
+
+    @property
+    def mean(self) -> np.ndarray:
+        return .5 * (self.peak + self.valley)
+
+    @property
+    def range(self) -> np.ndarray:
+        return self.peak - self.valley
+
+    @property
+    def count(self) -> np.ndarray:
+        """1 for full cycles and 0.5 for half cycles."""
+        return np.where(self.data['full'], 1., .5)
+
+    @property
+    def peak(self) -> np.ndarray:
+        return self.data['peak']
+
+    @property
+    def valley(self) -> np.ndarray:
+        return self.data['valley']
+
+    @property
+    def start(self):
+        """Signal index of the start of the cycles, if kept."""
+        if 'start' in self.data.dtype.names:
+            return self.data['start']
+        return None
+
+    @property
+    def end(self):
+        """Signal index of the end of the cycles, if kept."""
+        if 'end' in self.data.dtype.names:
+            return self.data['end']
+        return None
@@ -0,0 +1,184 @@
+"""
+Disk cache of the columns decoded from IMU files.
+
+Each IMU file has one ``.npz`` entry in the cache directory holding the time
+column and every channel parsed so far. An entry is only used if the size,
+modification time and content digest of the IMU file are the ones it was
+created from. The directory is kept under a size cap by evicting the least
+recently used entries.
+"""
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+# default size cap of the cache directory in bytes
+MAX_CACHE_SIZE = 2 * 1024 ** 3
+
+# bytes read at a time when hashing an IMU file
+_BLOCK = 1024 ** 2
+
+
+def content_hash(file_path: str) -> str:
+    """
+    Hashes the whole content of a file.
+
+    :param file_path: path to the IMU file
+    :return: hexadecimal digest
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(_BLOCK), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def fingerprint(file_path: str) -> tuple:
+    """
+    Identifies the current content of a file.
+
+    :param file_path: path to the IMU file
+    :return: size in bytes, modification time in ns and ``content_hash``
+     of the file
+    """
+    stat = os.stat(file_path)
+    return stat.st_size, stat.st_mtime_ns, content_hash(file_path)
+
+
+def load(cache_dir: str, file_path: str, col_list: list):
+    """
+    Looks up the decoded columns of an IMU file.
+
+    :param cache_dir: cache directory
+    :param file_path: path to the IMU file
+    :param col_list: desired columns, excluding the datetime column
+    :return: list of 1D arrays, time first, then ``col_list``; or ``None``
+     if the file is not cached, has changed or misses any of the columns
+    """
+    entry = _entry_path(cache_dir, file_path)
+    if not os.path.isfile(entry):
+        return None
+
+    try:
+        with np.load(entry) as npz:
+            if _stored_fingerprint(npz) != fingerprint(file_path):
+                return None
+            keys = ['time'] + [f'col_{i}' for i in col_list]
+            if not set(keys).issubset(npz.files):
+                return None
+            columns = [npz[k] for k in keys]
+    except (OSError, ValueError, KeyError):  # unreadable or partial entry
+        return None
+
+    os.utime(entry)  # mark as recently used
+    return columns
+
+
+def store(cache_dir: str, file_path: str, col_list: list, columns: list,
+          max_size: int = MAX_CACHE_SIZE):
+    """
+    Stores the decoded columns of an IMU file, merged with any columns of
+    the same file content already in the cache, then evicts the least
+    recently used entries over ``max_size``.
+
+    :param cache_dir: cache directory, created if missing
+    :param file_path: path to the IMU file
+    :param col_list: columns in ``columns``, excluding the datetime column
+    :param columns: list of 1D arrays, time first, then ``col_list``
+    :param max_size: size cap of the cache directory in bytes
+    :return: None
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    entry = _entry_path(cache_dir, file_path)
+    size, mtime_ns, digest = fingerprint(file_path)
+
+    arrays = {}
+    try:
+        with np.load(entry) as npz:
+            if _stored_fingerprint(npz) == (size, mtime_ns, digest):
+                arrays = {k: npz[k] for k in npz.files}
+    except (OSError, ValueError, KeyError):
+        pass
+
+    arrays['time'] = np.ravel(columns[0])
+    for i, column in zip(col_list, columns[1:]):
+        arrays[f'col_{i}'] = np.ravel(column)
+    arrays.update(size=np.int64(size), mtime_ns=np.int64(mtime_ns),
+                  digest=np.array(digest))
+
+    write_npz(entry, arrays)
+    evict(cache_dir, max_size)
+
+
+def write_npz(path: str, arrays: dict):
+    """
+    Writes arrays into an ``.npz`` file. They are written to a temporary
+    file of the same directory first, then moved in place, so readers never
+    see a partial file.
+
+    :param path: path to the file, replaced if it exists
+    :param arrays: dict of arrays
+    :return: None
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or '.',
+                               suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(tmp, path)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def evict(cache_dir: str, max_size: int = MAX_CACHE_SIZE):
+    """
+    Removes the least recently used entries until the cache directory is
+    not larger than ``max_size``.
+
+    :param cache_dir: cache directory
+    :param max_size: size cap in bytes
+    :return: None
+    """
+    old_first = sorted(entries(cache_dir), key=lambda e: e.stat().st_mtime_ns)
+
+    total = sum(e.stat().st_size for e in old_first)
+    for e in old_first:
+        if total <= max_size:
+            break
+        total -= e.stat().st_size
+        os.remove(e.path)
+
+
+def entries(cache_dir: str) -> list:
+    """
+    Lists the ``.npz`` entries of a cache directory.
+
+    :param cache_dir: cache directory
+    :return: list of ``os.DirEntry``, empty if the directory is missing
+    """
+    if not os.path.isdir(cache_dir):
+        return []
+    return [e for e in os.scandir(cache_dir)
+            if e.is_file() and e.name.endswith('.npz')]
+
+
+def clear(cache_dir: str):
+    """
+    Removes every entry from the cache directory.
+
+    :param cache_dir: cache directory
+    :return: None
+    """
+    evict(cache_dir, max_size=0)
+
+
+def _entry_path(cache_dir: str, file_path: str) -> str:
+    key = hashlib.blake2b(os.path.abspath(file_path).encode(),
+                          digest_size=16).hexdigest()
+    return os.path.join(cache_dir, key + '.npz')
+
+
+def _stored_fingerprint(npz) -> tuple:
+    return int(npz['size']), int(npz['mtime_ns']), str(npz['digest'])
@@ -0,0 +1,258 @@
+"""
+Exceedance function of the peaks and valleys of the cycles, exact at any
+g level, and accumulator of the level crossings of a fleet on a fixed grid.
+"""
+import numpy as np
+
+from utils import level_crossing
+
+# default extent of the levels of `ExceedanceAccumulator` in g
+GRID_MAX_G = 4.
+GRID_MIN_G = -2.
+
+
+class Exceedance:
+    """
+    Number of times the cycles of one or more flights exceed any level:
+    upwards for levels at or above the baseline, downwards below it.
+
+    The distinct peak and valley values are kept sorted with their counts
+    and cumulative counts, so a query is a binary search and the curve can
+    be evaluated at any resolution without the cycles. The exceedances of
+    several flights are merged into one.
+    """
+
+    __slots__ = ('base_g', 'values', 'counts', 'cumulative')
+
+    def __init__(self, values: np.ndarray, counts: np.ndarray,
+                 base_g: float = 1.):
+        """
+        :param values: distinct peak and valley values, sorted ascending
+        :param counts: number of peaks and valleys of each value
+        :param base_g: baseline
+        """
+        self.base_g = base_g
+        self.values = values
+        self.counts = counts
+        # counts are multiples of .5, so the sums are exact
+        self.cumulative = np.r_[0., np.cumsum(counts)]
+
+    @classmethod
+    def from_cycles(cls, cycles, base_g: float = 1.):
+        """
+        Builds the exceedance of the cycles of a flight.
+
+        :param cycles: `CycleTable`
+        :param base_g: baseline
+        :return: Exceedance
+        """
+        counts = cycles.count
+        return cls._from_values(np.r_[cycles.peak, cycles.valley],
+                                np.r_[counts, counts], base_g)
+
+    @classmethod
+    def from_reversals(cls, reversals: np.ndarray, base_g: float = 1.):
+        """
+        Builds the exceedance of the rainflow cycles of a signal without
+        counting them, see ``level_crossing.reversal_cross_count``.
+
+        :param reversals: 1D array, the reversals or the signal itself
+        :param base_g: baseline
+        :return: Exceedance
+        """
+        return cls._from_values(*level_crossing.reversal_counts(reversals),
+                                base_g)
+
+    @classmethod
+    def merge(cls, exceedances):
+        """
+        Merges the exceedances of several flights with the same baseline.
+
+        :param exceedances: iterable of Exceedance
+        :return: Exceedance
+        """
+        exceedances = list(exceedances)
+        base_g = exceedances[0].base_g
+        if any(e.base_g != base_g for e in exceedances):
+            raise ValueError('exceedances with different baselines')
+        return cls._from_values(
+            np.concatenate([e.values for e in exceedances]),
+            np.concatenate([e.counts for e in exceedances]), base_g)
+
+    def __add__(self, other):
+        return Exceedance.merge([self, other])
+
+    def above(self, levels):
+        """
+        Counts the peaks and valleys at or above the baseline that reach
+        each level, i.e. are ``>=`` it.
+
+        :param levels: float or array of levels
+        :return: float or array of counts
+        """
+        levels = np.maximum(levels, self.base_g)
+        return self.cumulative[-1] - self.cumulative[
+            np.searchsorted(self.values, levels, side='left')]
+
+    def below(self, levels):
+        """
+        Counts the peaks and valleys below the baseline that reach each
+        level, i.e. are ``<=`` it.
+
+        :param levels: float or array of levels
+        :return: float or array of counts
+        """
+        below_base = np.searchsorted(self.values, self.base_g, side='left')
+        return self.cumulative[np.minimum(
+            np.searchsorted(self.values, levels, side='right'), below_base)]
+
+    def __call__(self, levels):
+        """
+        Counts the exceedances of each level: upwards at or above the
+        baseline, downwards below it.
+
+        :param levels: float or array of levels
+        :return: float or array of counts
+        """
+        return np.where(np.asarray(levels) >= self.base_g,
+                        self.above(levels), self.below(levels))
+
+    def level_crossings(self, level_width: float) -> (list, list, np.ndarray,
+                                                      np.ndarray):
+        """
+        Evaluates the exceedance on levels ``level_width`` apart from the
+        baseline, identical to ``level_crossing.level_cross_count`` of the
+        cycles at this resolution.
+
+        :param level_width: Width of the desired levels
+        :return: two lists containing the bins above and below baseline,
+         and two arrays containing the counts of each bin above and below
+         baseline.
+        """
+        top_bins, bottom_bins, top_intervals, bottom_intervals = \
+            level_crossing.level_bins(self.values[-1], self.values[0],
+                                      level_width, self.base_g)
+
+        # levels computed as in `level_cross_count`
+        top_counts = self.above(
+            self.base_g + np.arange(top_intervals) * level_width)
+        bottom_counts = self.below(
+            -(-self.base_g + np.arange(bottom_intervals) * level_width))
+
+        return top_bins, bottom_bins, top_counts, bottom_counts
+
+    @classmethod
+    def _from_values(cls, values, counts, base_g):
+        values, inverse = np.unique(values, return_inverse=True)
+        return cls(values, np.bincount(inverse.reshape(-1), counts,
+                                       minlength=len(values)), base_g)
+
+
+class ExceedanceAccumulator:
+    """
+    Level crossings of a fleet on a fixed grid of levels ``level_width``
+    apart from the baseline, spanning ``min_g`` to ``max_g``.
+
+    Flights are added one at a time and need not be kept; accumulators of
+    parts of the fleet, e.g. from parallel workers, are merged into one.
+    The memory used only depends on the grid. Peaks and valleys beyond the
+    grid still count at every level of the grid, so its counts are exact,
+    but the levels beyond it are not counted.
+    """
+
+    def __init__(self, level_width: float, base_g: float = 1.,
+                 max_g: float = GRID_MAX_G, min_g: float = GRID_MIN_G):
+        """
+        :param level_width: Width of the levels
+        :param base_g: Baseline
+        :param max_g: Highest value the levels above the baseline cover
+        :param min_g: Lowest value the levels below the baseline cover
+        """
+        self.level_width = level_width
+        self.base_g = base_g
+        self.max_g = max_g
+        self.min_g = min_g
+
+        self.top_bins, self.bottom_bins, top_intervals, bottom_intervals = \
+            level_crossing.level_bins(max_g, min_g, level_width, base_g)
+        self.top_counts = np.zeros(top_intervals)
+        self.bottom_counts = np.zeros(bottom_intervals)
+        self.beyond = 0.  # counts of the peaks and valleys beyond the grid
+        self.flights = 0
+        # extremes of the values added, which lay out the levels reported
+        self.max_signal = -np.inf
+        self.min_signal = np.inf
+
+    def add(self, values: np.ndarray, counts: np.ndarray):
+        """
+        Adds the crossings of peak and valley values.
+
+        :param values: peak and valley values
+        :param counts: number of times each value is a peak or a valley
+        :return: None
+        """
+        values = np.asarray(values, dtype='float64')
+        counts = np.asarray(counts, dtype='float64')
+        w, base = self.level_width, self.base_g
+        top, bottom = len(self.top_counts), len(self.bottom_counts)
+
+        # levels computed as in `level_cross_count`
+        above = values >= base
+        self.top_counts += level_crossing.exceedance_counts(
+            values[above], counts[above], base, w, top)
+        self.bottom_counts += level_crossing.exceedance_counts(
+            -values[~above], counts[~above], -base, w, bottom)
+
+        beyond = (values >= base + top * w) | (-values >= -base + bottom * w)
+        self.beyond += counts[beyond].sum()
+        if len(values):
+            self.max_signal = max(self.max_signal, values.max())
+            self.min_signal = min(self.min_signal, values.min())
+
+    def add_exceedance(self, exceedance: Exceedance):
+        """
+        Adds the crossings of a flight.
+
+        :param exceedance: Exceedance of the flight
+        :return: None
+        """
+        if exceedance.base_g != self.base_g:
+            raise ValueError('exceedance with a different baseline')
+        self.add(exceedance.values, exceedance.counts)
+        self.flights += 1
+
+    def merge(self, other):
+        """
+        Adds the crossings accumulated by another accumulator with the same
+        grid.
+
+        :param other: ExceedanceAccumulator
+        :return: None
+        """
+        if (other.level_width, other.base_g, other.max_g, other.min_g) != \
+                (self.level_width, self.base_g, self.max_g, self.min_g):
+            raise ValueError('accumulators with different grids')
+        self.top_counts += other.top_counts
+        self.bottom_counts += other.bottom_counts
+        self.beyond += other.beyond
+        self.flights += other.flights
+        self.max_signal = max(self.max_signal, other.max_signal)
+        self.min_signal = min(self.min_signal, other.min_signal)
+
+    def level_crossings(self) -> (list, list, np.ndarray, np.ndarray):
+        """
+        Returns the accumulated counts on the levels ``level_bins`` lays
+        out for the extremes of all the values added, cut to the grid: for
+        flights within the grid, the sum of their ``level_cross_count``
+        results, padded with zeros to the widest one.
+
+        :return: two lists containing the bins above and below baseline,
+         and two arrays containing the counts of each bin above and below
+         baseline.
+        """
+        if self.max_signal < self.min_signal:  # nothing added
+            return [], [], np.zeros(0), np.zeros(0)
+        _, _, top, bottom = level_crossing.level_bins(
+            self.max_signal, self.min_signal, self.level_width, self.base_g)
+        return self.top_bins[:top], self.bottom_bins[:bottom], \
+            self.top_counts[:top].copy(), self.bottom_counts[:bottom].copy()
@@ -8,12 +8,12 @@ impact study of the reduction filter when throwing away data.
 import math
 
 import numpy as np
-import rainflow
 from matplotlib import pyplot as plt
 import seaborn as sns
 from matplotlib.ticker import LogFormatterSciNotation, MultipleLocator
 
-from utils import get_data_np, level_crossing, graphs
+from utils import get_data_np, level_crossing, graphs, rainflow_kernel
+from utils.cycle_table import CycleTable
 
 sns.set_theme(style='whitegrid', palette='colorblind',
               font='DejaVu Sans', font_scale=.6)
@@ -35,22 +35,7 @@ for i in range(window_size):
     t = [data[0][var] for var in temp if var % 10 == i]
     nz = np.array([data[1][var] for var in temp if var % 10 == i]).reshape(-1)
 
-    cyc_prop = {
-        'cyc_mean': [], 'cyc_range': [], 'cyc_count': [],
-        'start_i': [], 'end_i': [],
-        'peak': [], 'valley': []}
-
-    for rg, mn, c, i_s, i_e in rainflow.extract_cycles(nz):
-        cyc_prop['cyc_mean'].append(mn)
-        cyc_prop['cyc_range'].append(rg)
-        cyc_prop['cyc_count'].append(c)
-        cyc_prop['start_i'].append(nz[i_s])
-        cyc_prop['end_i'].append(nz[i_e])
-        cyc_prop['peak'].append(mn + rg / 2)
-        cyc_prop['valley'].append(mn - rg / 2)
-
-    cycles = np.column_stack(
-        (cyc_prop['cyc_count'], cyc_prop['peak'], cyc_prop['valley']))
+    cycles = CycleTable.from_cycles(rainflow_kernel.extract_cycles(nz))
 
     top_bins, bottom_bins, top_counts, bottom_counts \
         = level_crossing.level_cross_count(cycles, .002)
@@ -1,11 +1,17 @@
+import bz2
 import gc
+import gzip
 import logging
+import lzma
 import os
 from datetime import datetime
 from colorlog import ColoredFormatter
 
 import numpy as np
 
+from utils import data_cache
+from utils.validation import FlightRejected, ValidationRules
+
 logger = logging.getLogger(__name__)  # create logger
 logger.setLevel(logging.INFO)  # set logger's leve
 
@@ -19,70 +25,561 @@ console_handler.setFormatter(formatter)  # assign formatter to stream handler
 
 logger.addHandler(console_handler)  # assign handler to logger
 
+# length of an IMU record in bytes including the line feed
+RECORD_LENGTH = 153
+
+# bytes which may appear inside a fixed-point numeric field
+_NUMERIC_BYTES = np.zeros(256, dtype=bool)
+_NUMERIC_BYTES[list(b' +-.0123456789')] = True
+
+# default number of records decoded at a time (about 1.5 h at 100 Hz)
+CHUNK_SIZE = 500_000
+
+# compressed IMU files are decompressed on the fly by the matching opener
+_OPENERS = {'.gz': gzip.open, '.xz': lzma.open, '.bz2': bz2.open}
+
 
 def get_data(file_path: str,
-             col_list: list) -> list:
+             col_list: list,
+             cache_dir: str = None,
+             max_cache_size: int = data_cache.MAX_CACHE_SIZE,
+             rules: ValidationRules = None) -> list:
     """
     Reads data file generated by "IMU" and parses the desired columns.
 
 
     Note
     -------
-    This function first checks whether the last line of the IMU file misses
-    dara in which case removes the line permanently.
+    An incomplete last record is ignored. The file is opened read-only and
+    never modified.
+
+    Records have a fixed width, so the file is mapped as a matrix of bytes
+    and only the byte spans of the timestamp and the fields in ``col_list``
+    are decoded. Files which do not follow a fixed-width layout are parsed
+    with ``np.loadtxt`` instead.
 
 
     Parameters
     -------
     file_path : str
         The path to the `dat` file containing timestamp and acceleration
-        components.
+        components. ``.dat.gz``, ``.dat.xz`` and ``.dat.bz2`` files are
+        decompressed as they are read.
 
     col_list : list
         The list of desired columns to be extracted excluding the datetime
         column. Datetime column is always included as the first column.
 
+    cache_dir : str, optional
+        A directory where the decoded columns are cached. When given, the
+        columns of a file which has not changed since it was cached are
+        loaded from there instead of being parsed again.
+
+    max_cache_size : int
+        The size cap of ``cache_dir`` in bytes. Least recently used entries
+        are evicted above it.
+
+    rules : ValidationRules, optional
+        Rules checked on each chunk as it is decoded. Reading stops at the
+        first chunk breaking one of them.
+
 
     Returns
     -------
     list
-        a list of 1D arrays. First item is datetime column, the rest are
-        defined by ``col_list``.
+        a list of ``(n, 1)`` float64 arrays. First item is the time in
+        seconds from the first record, the rest are defined by ``col_list``.
+
+
+    Raises
+    -------
+    FlightRejected
+        If ``rules`` are given and the file breaks one of them or cannot be
+        parsed.
     """
 
-    use_cols = [0, 1] + col_list
+    if cache_dir is not None:
+        columns = data_cache.load(cache_dir, file_path, col_list)
+        if columns is not None:
+            if rules is not None:  # the rules may have changed since
+                list(rules.validate([columns], col_list))
+            return [c.reshape((-1, 1)) for c in columns]
+
+    try:
+        chunks = iter_data(file_path, col_list)
+        if rules is not None:
+            chunks = rules.validate(chunks, col_list)
+        chunks = list(chunks)
+        columns = [np.concatenate(c).reshape((-1, 1)) for c in zip(*chunks)]
+    except ValueError as err:
+        logger.warning(f'Fixed-width parsing of "{file_path}" failed ({err}),'
+                       f' falling back to the text parser.')
+        try:
+            columns = _get_data_loadtxt(file_path, col_list)
+        except ValueError as err:
+            if rules is None:
+                raise
+            raise FlightRejected('unparsable', str(err)) from err
+        if rules is not None:
+            list(rules.validate([[c.reshape(-1) for c in columns]],
+                                col_list))
+
+    if cache_dir is not None:
+        data_cache.store(cache_dir, file_path, col_list, columns,
+                         max_cache_size)
+
+    return columns
+
+
+def iter_data(file_path: str,
+              col_list: list,
+              chunk_size: int = CHUNK_SIZE):
+    """
+    Reads an IMU file in chunks of records and parses the desired columns.
+    The file is memory-mapped and only one chunk is decoded at a time,
+    therefore the memory used is bounded by ``chunk_size`` rather than the
+    size of the file.
+
+
+    Note
+    -------
+    An incomplete last record is ignored. The file is not modified.
+
+
+    Parameters
+    -------
+    file_path : str
+        The path to the `dat` file containing timestamp and acceleration
+        components.
+
+    col_list : list
+        The list of desired columns to be extracted excluding the datetime
+        column.
+
+    chunk_size : int
+        The number of records in each chunk.
+
+
+    Yields
+    -------
+    list
+        a list of 1D float64 arrays per chunk. First item is the time in
+        seconds from the first record of the file, the rest are defined by
+        ``col_list``.
+
+
+    Raises
+    -------
+    ValueError
+        If the records do not have a fixed-width layout.
+    """
+
+    if os.path.splitext(file_path)[1] in _OPENERS:
+        chunks = _stream_chunks(file_path, chunk_size)
+    else:
+        records = _record_matrix(file_path)
+        chunks = (records[i:i + chunk_size]
+                  for i in range(0, len(records), chunk_size))
+
+    fields = [0, 1] + col_list
+    spans = t0 = None
+    for chunk in chunks:
+        if spans is None:  # layout and start time from the first chunk
+            spans = _field_spans(chunk[::max(1, len(chunk) // 1024)])
+            if max(fields) >= len(spans):
+                raise ValueError(f'records have only {len(spans)} fields')
+            t0 = _decode_timestamps(chunk[:1, slice(*spans[0])],
+                                    chunk[:1, slice(*spans[1])])[0]
+
+        if not _borders_blank(chunk, [spans[i] for i in fields]):
+            # some values are wider than in the sample, use all records
+            wider = _field_spans(chunk)
+            if len(wider) != len(spans) or \
+                    not _borders_blank(chunk, [wider[i] for i in fields]):
+                raise ValueError('records do not have a fixed-width layout')
+            spans = wider
+
+        stamps = _decode_timestamps(chunk[:, slice(*spans[0])],
+                                    chunk[:, slice(*spans[1])])
+        seconds = (stamps - t0) / np.timedelta64(1, 's')
+
+        yield [seconds] + [_parse_fixed_width(chunk[:, slice(*spans[i])])
+                           for i in col_list]
+
+
+def time_span(file_path: str) -> tuple:
+    """
+    Finds the number of complete records of an IMU file and the timestamps
+    of its first and last records. An uncompressed file is not read beyond
+    these two records; a compressed one is decompressed in full.
+
+
+    Parameters
+    -------
+    file_path : str
+        The path to the IMU file.
+
+
+    Returns
+    -------
+    tuple[int, np.datetime64, np.datetime64]
+        The number of records, the first and the last timestamps.
+
+
+    Raises
+    -------
+    ValueError
+        If the file has no complete record or its timestamps cannot be
+        decoded.
+    """
+
+    if os.path.splitext(file_path)[1] in _OPENERS:
+        n, first, last = 0, None, None
+        for chunk in _stream_chunks(file_path, CHUNK_SIZE):
+            if first is None:
+                first = chunk[:1].copy()
+            n += len(chunk)
+            last = chunk[-1:].copy()
+    else:
+        n, record_length, width = record_layout(file_path)
+        first = last = None
+        if n:
+            with open(file_path, 'rb') as f:
+                first = f.read(width)
+                f.seek((n - 1) * record_length)
+                last = f.read(width)
+            first, last = [np.frombuffer(r, dtype=np.uint8).reshape((1, -1))
+                           for r in (first, last)]
+
+    if not n:
+        raise ValueError(f'"{file_path}" does not contain a complete record.')
+
+    return n, _record_timestamp(first), _record_timestamp(last)
+
+
+def first_timestamp(file_path: str) -> np.datetime64:
+    """
+    Decodes the timestamp of the first record of an IMU file. Only that
+    record is read, or decompressed.
+
+
+    Parameters
+    -------
+    file_path : str
+        The path to the IMU file.
+
+
+    Returns
+    -------
+    np.datetime64
+        The first timestamp.
+
+
+    Raises
+    -------
+    ValueError
+        If the file has no complete record or its timestamp cannot be
+        decoded.
+    """
+
+    with open_imu(file_path) as f:
+        head = f.read(2 * RECORD_LENGTH)
+    record_length, width = _line_layout(head, file_path)
+
+    return _record_timestamp(
+        np.frombuffer(head[:width], dtype=np.uint8).reshape((1, -1)))
+
+
+def is_imu_file(file_name: str) -> bool:
+    """
+    Checks whether a file name has the extension of an IMU file, either
+    ``.dat`` or a compressed ``.dat.gz``, ``.dat.xz`` or ``.dat.bz2``.
+    """
+
+    return any(file_name.endswith('.dat' + ext) for ext in [''] + [*_OPENERS])
+
+
+def open_imu(file_path: str, mode: str = 'rb'):
+    """
+    Opens an IMU file for reading, decompressing it on the fly if its
+    extension is ``.gz``, ``.xz`` or ``.bz2``.
+
+    Parameters
+    -------
+    file_path : str
+        The path to the IMU file.
+
+    mode : str
+        ``'rb'`` or ``'rt'``.
+
+    Returns
+    -------
+    file object
+    """
+
+    opener = _OPENERS.get(os.path.splitext(file_path)[1], open)
+    return opener(file_path, mode)
+
+
+def record_layout(file_path: str) -> tuple:
+    """
+    Determines the layout of an uncompressed IMU file from its first record
+    and its size, without reading the rest of the file.
+
+    Parameters
+    -------
+    file_path : str
+        The path to the IMU file.
+
+    Returns
+    -------
+    tuple[int, int, int]
+        The number of complete records, the record length including the
+        line break and the record width excluding the line break. The last
+        record may miss its line break and still be complete.
+
+    Raises
+    -------
+    ValueError
+        If the file does not contain a complete first record.
+    """
+
+    with open(file_path, 'rb') as f:
+        head = f.read(2 * RECORD_LENGTH)
+        size = f.seek(0, os.SEEK_END)
+
+    record_length, width = _line_layout(head, file_path)
+
+    n = (size - width) // record_length + 1 if size >= width else 0
+    return n, record_length, width
+
+
+def _line_layout(head: bytes, file_path: str) -> tuple:
+    """
+    Returns the record length including the line break and the record
+    width excluding it, from the first bytes of an IMU file.
+    """
+
+    record_length = head.find(b'\n') + 1
+    if record_length == 0:
+        raise ValueError(f'"{file_path}" does not contain a complete record.')
+
+    return record_length, len(head[:record_length].rstrip(b'\r\n'))
+
+
+def complete_length(file_path: str) -> int:
+    """
+    Returns the number of bytes of an IMU file which hold complete
+    records, i.e. the size of the file without its incomplete tail.
+
+    Parameters
+    -------
+    file_path : str
+        The path to the IMU file.
+
+    Returns
+    -------
+    int
+        The length of the complete records in bytes.
+    """
+
+    n, record_length, _ = record_layout(file_path)
+    return min(os.path.getsize(file_path), n * record_length)
+
+
+def _record_matrix(file_path: str) -> np.ndarray:
+    """
+    Maps the complete records of an IMU file as a read-only ``(n, width)``
+    matrix of bytes, one row per record, where ``width`` is the record
+    length without the line break.
+
+    Nothing is read until a block of the matrix is used, so decoding a few
+    columns does not copy the rest of the record into memory.
+    """
+
+    n, record_length, width = record_layout(file_path)
+    if n * record_length < os.path.getsize(file_path):
+        logger.warning(f'The last line of the IMU file "{file_path}" was '
+                       f'ignored due to incomplete data record.')
+
+    buffer = np.memmap(file_path, dtype=np.uint8, mode='r')
+    return np.ndarray((n, width), dtype=np.uint8, buffer=buffer,
+                      strides=(record_length, 1))
 
-    # check if the last line has any missing data. remove line if so
-    with open(file_path, 'r+') as file:
 
-        file.seek(0, os.SEEK_END)  # go to last byte of the file
-        last_pos = file.tell()  # record the position of the last byte
-        pos = file.tell() - 1
+def _stream_chunks(file_path: str, chunk_size: int):
+    """
+    Decompresses an IMU file and yields its complete records as
+    ``(n, width)`` matrices of bytes of up to ``chunk_size`` rows. Only one
+    chunk of the decompressed data is held in memory at a time.
+    """
+
+    with open_imu(file_path) as stream:
+        buffer = stream.read(2 * RECORD_LENGTH)
+        record_length, width = _line_layout(buffer, file_path)
+
+        while True:
+            data = stream.read(
+                max(chunk_size * record_length - len(buffer), record_length))
+            buffer += data
+
+            if data:
+                n = len(buffer) // record_length
+            else:  # the last record may miss its line break
+                n = (len(buffer) - width) // record_length + 1 \
+                    if len(buffer) >= width else 0
+                if n * record_length < len(buffer):
+                    logger.warning(f'The last line of the IMU file '
+                                   f'"{file_path}" was ignored due to '
+                                   f'incomplete data record.')
+
+            if n:
+                yield np.ndarray((n, width), dtype=np.uint8, buffer=buffer,
+                                 strides=(record_length, 1))
+            buffer = buffer[n * record_length:]
+
+            if not data:
+                break
+
+
+def _record_timestamp(record: np.ndarray) -> np.datetime64:
+    """
+    Decodes the timestamp of a ``(1, width)`` record.
+    """
+
+    spans = _field_spans(record)
+    if len(spans) < 2:
+        raise ValueError('records do not start with a timestamp')
+    return _decode_timestamps(record[:, slice(*spans[0])],
+                              record[:, slice(*spans[1])])[0]
+
+
+def _field_spans(records: np.ndarray) -> list:
+    """
+    Finds the ``(start, stop)`` byte positions of the whitespace separated
+    fields of the records. A byte is a separator if it is blank in all of
+    them.
+    """
+
+    is_space = (records == ord(' ')).all(axis=0)
+    edges = np.flatnonzero(np.diff(np.r_[True, is_space, True]))
+
+    return [(int(a), int(b)) for a, b in zip(edges[::2], edges[1::2])]
+
+
+def _borders_blank(records: np.ndarray, spans: list) -> bool:
+    """
+    Checks that the separators around the fields at ``spans`` are blank in
+    every record.
+    """
+
+    borders = [j for a, b in spans for j in (a - 1, b)
+               if 0 <= j < records.shape[1]]
+    return bool((records[:, borders] == ord(' ')).all())
+
+
+def _parse_fixed_width(field: np.ndarray) -> np.ndarray:
+    """
+    Decodes a ``(n, width)`` block of bytes holding one fixed-point number
+    per row into a float64 array.
+
+    Digits are accumulated into an integer mantissa which is then divided by
+    the power of ten of its decimal places, so the results are rounded
+    exactly like ``float(str)``.
+
+    Raises
+    -------
+    ValueError
+        If the field contains anything but signs, digits, a decimal point
+        and blanks.
+    """
+
+    if not _NUMERIC_BYTES[field].all():
+        raise ValueError('non fixed-point characters in a numeric field')
+
+    n, width = field.shape
+    started = np.zeros(n, dtype=bool)
+    ended = np.zeros(n, dtype=bool)
+    for j in range(width):  # a single token per row
+        blank = field[:, j] == ord(' ')
+        if (ended & ~blank).any():
+            raise ValueError('more than one value in a numeric field')
+        ended |= started & blank
+        started |= ~blank
+
+    is_point = field == ord('.')
+    point = np.where(is_point.any(axis=1), is_point.argmax(axis=1), width)
+
+    mantissa = np.zeros(n, dtype=np.int64)
+    decimals = np.zeros(n, dtype=np.int64)
+    for j in range(width):
+        digit = field[:, j] - ord('0')
+        is_digit = digit <= 9  # unsigned, non-digits wrap around
+        mantissa = np.where(is_digit, mantissa * 10 + digit, mantissa)
+        decimals += is_digit & (j > point)
+
+    values = mantissa / 10. ** decimals
+    values[(field == ord('-')).any(axis=1)] *= -1
+
+    return values
 
-        file.seek(pos, os.SEEK_SET)  # go one position back
-        temp_str = file.read(1)  # read from current position
 
-        # Beginning of an empty line at the EOF
-        if temp_str == '\n' and last_pos % 153 in [0, 152]:
-            pass
+def _decode_timestamps(date: np.ndarray, time: np.ndarray) -> np.ndarray:
+    """
+    Decodes the ``dd-mm-YYYY`` date and ``HH:MM:SS.ffffff?`` time fields,
+    given as ``(n, width)`` blocks of bytes, into ``datetime64[us]``. The
+    last digit of the time field is ignored, as it is not part of the
+    recorded time.
+
+    Raises
+    -------
+    ValueError
+        If the fields do not follow the above format.
+    """
+
+    if (date.shape[1] != 10 or not 11 <= time.shape[1] <= 16
+            or (date[:, [2, 5]] != ord('-')).any()
+            or (time[:, [2, 5]] != ord(':')).any()
+            or (time[:, 8] != ord('.')).any()):
+        raise ValueError('timestamps are not "dd-mm-YYYY HH:MM:SS.ffffff"')
+
+    def number(block, positions):
+        digits = block[:, positions].astype(np.int64) - ord('0')
+        if ((digits < 0) | (digits > 9)).any():
+            raise ValueError('non-digit characters in a timestamp')
+        return digits @ 10 ** np.arange(len(positions) - 1, -1, -1)
 
-        # at the end of a complete line
-        elif temp_str != '\n' and last_pos % 153 == 151:
-            pass
+    day, month, year = (number(date, [0, 1]), number(date, [3, 4]),
+                        number(date, [6, 7, 8, 9]))
+    fraction = list(range(9, time.shape[1] - 1))
+    micro = number(time, fraction) * 10 ** (6 - len(fraction))
+    micro += (number(time, [0, 1]) * 3600 + number(time, [3, 4]) * 60
+              + number(time, [6, 7])) * 10 ** 6
 
-        else:
-            while file.read(1) != "\n":  # find EOL of the last complete line
-                pos -= 1
-                file.seek(pos, os.SEEK_SET)
+    # days since epoch of the proleptic gregorian calendar date
+    year -= month <= 2
+    era = year // 400
+    day_of_era = ((153 * ((month + 9) % 12) + 2) // 5 + day - 1
+                  + 365 * (year - era * 400) + (year - era * 400) // 4
+                  - (year - era * 400) // 100)
+    days = era * 146097 + day_of_era - 719468
 
-            file.seek(pos, os.SEEK_SET)  # go there
-            file.truncate()  # truncate from current position
-            logger.warning(f'The Last line of the IMU file "{file.name}"'
-                           f' was deleted due to incomplete data record.')
-            # print(f'\nWARNING: Last line of the IMU file "{file.name}" was '
-            #       f'deleted due to incomplete data record.\n')
+    return (days * 86_400_000_000 + micro).astype('datetime64[us]')
 
-        data = np.loadtxt(file.name, dtype='object', usecols=use_cols)
+
+def _get_data_loadtxt(file_path: str, col_list: list) -> list:
+    """
+    Parses the IMU file with ``np.loadtxt``. This is the generic text
+    parser used when the records do not have a fixed-width layout.
+    """
+
+    with open_imu(file_path, 'rt') as file:
+        lines = file.read().splitlines()
+    if len(lines) > 1 and len(lines[-1]) != len(lines[0]):  # incomplete
+        lines = lines[:-1]
+
+    use_cols = [0, 1] + col_list
+    data = np.loadtxt(lines, dtype='object', usecols=use_cols)
 
     # convert the first two columns into a column of seconds
     data[:, 0] = data[:, 0] + [' '] + data[:, 1]
@@ -98,4 +595,5 @@ def get_data(file_path: str,
 
     gc.collect()
 
-    return [data[:, i].reshape((-1, 1)) for i in range(data.shape[1])]
+    return [data[:, i].astype('float64').reshape((-1, 1))
+            for i in range(data.shape[1])]
@@ -2,19 +2,19 @@ from math import floor, ceil
 
 import numpy as np
 
+from utils import rainflow_kernel
 
-def level_cross_count(signal: np.ndarray,
+
+def level_cross_count(cycles,
                       level_width: float,
                       base_g: float = 1.) -> (list, list, np.ndarray,
                                               np.ndarray):
     """
-    Count the level crossing given a baseline, resolution, and an (n x 3)
-    array containing counts, max and min of each cycle type.
+    Count the level crossing given a baseline, resolution, and the table of
+    cycles resulted from rainflow counting.
 
-    :param signal: `(n x 3)` array. Each row represents a type of cycle.
-     First column is the counts of that cycle type, resulted from rainflow
-     counting. Second column is the maximum value of that cycle family and
-     the third column is the minimum value of that cycle family.
+    :param cycles: `CycleTable`. Each row represents a type of cycle. Its
+     counts, maximum value (peak) and minimum value (valley) are used.
     :param level_width: Width of the desired levels
     :param base_g: Baseline
 
@@ -22,9 +22,105 @@ def level_cross_count(signal: np.ndarray,
      and two arrays containing the counts of each bin above and below baseline.
     """
 
-    # largest and smallest signals
-    max_signal = max(signal[:, 1])
-    min_signal = min(signal[:, 2])
+    counts = cycles.count
+
+    # both the peak and the valley of a cycle cross levels
+    return value_cross_count(np.r_[cycles.peak, cycles.valley],
+                             np.r_[counts, counts], level_width, base_g)
+
+
+def reversal_cross_count(reversals: np.ndarray,
+                         level_width: float,
+                         base_g: float = 1.) -> (list, list, np.ndarray,
+                                                 np.ndarray):
+    """
+    Count the level crossing given a baseline, resolution, and the
+    reversals of the signal, without counting cycles.
+
+    Rainflow counting pairs every reversal with others into cycles, and
+    each reversal is the peak or valley of cycles whose counts add up to 1,
+    except the first and the last ones which end a single half cycle. The
+    result is therefore the one of ``level_cross_count`` for the cycles of
+    the reversals, whose peaks and valleys are the exact reversal values.
+
+    :param reversals: 1D array, the reversals or the signal itself
+    :param level_width: Width of the desired levels
+    :param base_g: Baseline
+
+    :return: two lists containing the bins above and below baseline,
+     and two arrays containing the counts of each bin above and below baseline.
+    """
+
+    values, counts = reversal_counts(reversals)
+    return value_cross_count(values, counts, level_width, base_g)
+
+
+def reversal_counts(reversals: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    Finds the reversals of a signal and the number of times each one is the
+    peak or valley of a rainflow cycle.
+
+    :param reversals: 1D array, the reversals or the signal itself
+    :return: values of the reversals and their counts
+    """
+
+    values, _ = rainflow_kernel.find_reversals(reversals)
+    counts = np.ones(len(values))
+    if len(values) > 1:  # the ends are in a single half cycle
+        counts[[0, -1]] = .5
+    else:  # no cycle
+        counts[:] = 0.
+    return values, counts
+
+
+def value_cross_count(values: np.ndarray, counts: np.ndarray,
+                      level_width: float, base_g: float = 1.) -> (
+        list, list, np.ndarray, np.ndarray):
+    """
+    Count the level crossing given a baseline, resolution, and the peak and
+    valley values of the cycles, e.g. of several flights at once.
+
+    :param values: peak and valley values, in any order
+    :param counts: number of times each value is a peak or a valley
+    :param level_width: Width of the desired levels
+    :param base_g: Baseline
+
+    :return: two lists containing the bins above and below baseline,
+     and two arrays containing the counts of each bin above and below baseline.
+    """
+
+    # levels covering the largest and smallest signals
+    top_bins, bottom_bins, top_intervals, bottom_intervals = level_bins(
+        np.amax(values), np.amin(values), level_width, base_g)
+
+    # count crossings: a value above the baseline crosses the levels
+    # `base_g + i * level_width` it reaches, one below it the levels
+    # `base_g - i * level_width`, for i = 0, 1, ...
+    above = values >= base_g
+    top_counts = exceedance_counts(values[above], counts[above],
+                                    base_g, level_width, top_intervals)
+    bottom_counts = exceedance_counts(-values[~above], counts[~above],
+                                       -base_g, level_width,
+                                       bottom_intervals)
+
+    return top_bins, bottom_bins, top_counts, bottom_counts
+
+
+def level_bins(max_signal: float,
+               min_signal: float,
+               level_width: float,
+               base_g: float = 1.) -> (list, list, int, int):
+    """
+    Lays out the levels above and below the baseline covering a signal.
+
+    :param max_signal: Largest value of the signal
+    :param min_signal: Smallest value of the signal
+    :param level_width: Width of the desired levels
+    :param base_g: Baseline
+
+    :return: two lists containing the bins above and below baseline, and
+     the number of bins above and below baseline.
+    """
 
     # intervals above baseline
     if (max_signal - base_g) % level_width != 0.0:
@@ -38,42 +134,38 @@ def level_cross_count(signal: np.ndarray,
         bottom_intervals = int(
             abs(floor((min_signal - base_g) / level_width))) + 1
 
-    # initiate counters and binners
-    top_counts = np.zeros(top_intervals)
-    bottom_counts = np.zeros(bottom_intervals)
+    # initiate binners
     top_bins = [round(base_g + level_width * (2 * i + 1) / 2, 5) for i in
                 range(top_intervals)]
     bottom_bins = [round(base_g - level_width * (2 * i + 1) / 2, 5) for i in
                    range(bottom_intervals)]
 
-    for n, peak, valley in signal:
-
-        # exclude head and tail
-        # if k == 0 or k == len(signal) - 1:
-        #     continue
-
-        # count peaks
-        if peak >= base_g:  # if above baseline
-            i = 0
-            while peak >= base_g + i * level_width:
-                i += 1
-            top_counts[:i] += n
-        else:  # if below baseline
-            i = 0
-            while peak <= base_g - i * level_width:
-                i += 1
-            bottom_counts[:i] += n
-
-        # count valleys
-        if valley >= base_g:  # if above baseline
-            i = 0
-            while valley >= base_g + i * level_width:
-                i += 1
-            top_counts[:i] += n
-        else:  # if below baseline
-            i = 0
-            while valley <= base_g - i * level_width:
-                i += 1
-            bottom_counts[:i] += n
+    return top_bins, bottom_bins, top_intervals, bottom_intervals
 
-    return top_bins, bottom_bins, top_counts, bottom_counts
+
+def exceedance_counts(values: np.ndarray, weights: np.ndarray,
+                       base: float, level_width: float,
+                       intervals: int) -> np.ndarray:
+    """
+    Counts, for each of the first ``intervals`` levels
+    ``base + i * level_width``, the weights of the values reaching beyond
+    it, i.e. the ``values`` ``>=`` the level and all the levels below.
+
+    :param values: values at or above ``base``
+    :param weights: count of each value
+    :param base: first level
+    :param level_width: distance between levels
+    :param intervals: number of levels counted
+    :return: array of the ``intervals`` counts
+    """
+    # levels computed as `base + i * level_width`, exactly as they are
+    # compared to one value at a time, one more than counted
+    levels = base + np.arange(intervals + 1) * level_width
+
+    # number of levels reached by each value; the ones beyond the last
+    # level counted only add to the counted levels
+    reached = np.minimum(np.digitize(values, levels), intervals)
+
+    # a value reaching `i` levels is counted in the first `i` levels
+    totals = np.bincount(reached, weights, minlength=intervals + 1)
+    return np.cumsum(totals[::-1])[::-1][1:]
@@ -1,58 +1,205 @@
+from collections import OrderedDict
+
 import numpy as np
 
-from utils import material_lib
-from math import floor, ceil
+from utils import level_crossing, material_lib
+from utils.exceedance import GRID_MAX_G, GRID_MIN_G
+
+# total size in bytes of the life tables, per material, kₜ and bin grid,
+# kept in memory; larger tables are not kept
+MAX_LIFE_TABLES_SIZE = 64 * 1024 ** 2
+
+# life tables kept, least recently used first
+_life_tables = OrderedDict()
+
+
+class SparseMatrix:
+    """
+    Matrix of counts storing only its occupied cells, in coordinate (COO)
+    format: the row, column and count of each cell, in row-major order.
+    Memory and sums scale with the occupied cells instead of the size of
+    the grid, e.g. for fine bins.
+    """
 
+    __slots__ = ('rows', 'cols', 'counts', 'shape')
+
+    def __init__(self, rows: np.ndarray, cols: np.ndarray,
+                 counts: np.ndarray, shape: tuple):
+        """
+        Parameters
+        ----------
+        rows: np.ndarray
+            The rows of the occupied cells.
+        cols: np.ndarray
+            The columns of the occupied cells.
+        counts: np.ndarray
+            The counts of the occupied cells.
+        shape: tuple
+            The number of rows and columns of the matrix.
+        """
+        self.rows = rows
+        self.cols = cols
+        self.counts = counts
+        self.shape = tuple(shape)
+
+    @classmethod
+    def from_indices(cls, rows, cols, counts, shape):
+        """
+        Sums the counts falling in the same cell.
+
+        Parameters
+        ----------
+        rows: np.ndarray
+            The row of each count, non-negative.
+        cols: np.ndarray
+            The column of each count, non-negative.
+        counts: np.ndarray
+            The counts.
+        shape: tuple
+            The number of rows and columns of the matrix.
+
+        Returns
+        -------
+        SparseMatrix
+        """
+        flat = np.ravel_multi_index((rows, cols), shape)
+        cells, inverse = np.unique(flat, return_inverse=True)
+        rows, cols = (i.astype('int32')
+                      for i in np.unravel_index(cells, shape))
+        return cls(rows, cols, np.bincount(inverse.reshape(-1), counts,
+                                           minlength=len(cells)), shape)
+
+    def __add__(self, other):
+        if self.shape != other.shape:
+            raise ValueError('matrices of different shapes')
+        return SparseMatrix.from_indices(
+            np.r_[self.rows, other.rows], np.r_[self.cols, other.cols],
+            np.r_[self.counts, other.counts], self.shape)
+
+    @property
+    def nnz(self) -> int:
+        """The number of occupied cells."""
+        return len(self.counts)
+
+    @property
+    def nbytes(self) -> int:
+        return self.rows.nbytes + self.cols.nbytes + self.counts.nbytes
+
+    def sum(self):
+        return self.counts.sum()
+
+    def toarray(self) -> np.ndarray:
+        """The dense matrix."""
+        matrix = np.zeros(self.shape)
+        matrix[self.rows, self.cols] = self.counts
+        return matrix
+
+
+class MeanRangeMatrix:
+    """
+    Mean-range matrix of a set of cycles: the counts of the cycles in each
+    (range, mean) bin, with the edges of the bins.
+
+    The counts are either dense or a ``SparseMatrix``. The object is not
+    modified once built, so it can be shared between threads and memoized,
+    e.g. per flight and bin sizes.
+    """
 
-def mean_range_matrix(cycles, mean_bin_size, range_bin_size):
+    __slots__ = ('counts', 'mean_bin_edges', 'range_bin_edges')
+
+    def __init__(self, counts: np.ndarray, mean_bin_edges: np.ndarray,
+                 range_bin_edges: np.ndarray):
+        """
+        Parameters
+        ----------
+        counts: np.ndarray or SparseMatrix
+            The counts of the cycles, one row per range bin and one column
+            per mean bin.
+        mean_bin_edges: np.ndarray
+            The edges of the mean bins.
+        range_bin_edges: np.ndarray
+            The edges of the range bins.
+        """
+        self.counts = counts
+        self.mean_bin_edges = mean_bin_edges
+        self.range_bin_edges = range_bin_edges
+
+    @classmethod
+    def from_cycles(cls, cycles, mean_bin_size, range_bin_size,
+                    sparse=False):
+        """
+        Bins the cycles, see ``mean_range_matrix``.
+
+        Returns
+        -------
+        MeanRangeMatrix
+        """
+        means, ranges, counts = cycles.mean, cycles.range, cycles.count
+
+        mean_bin_edges = _bin_edges(means, mean_bin_size)
+        range_bin_edges = _bin_edges(ranges, range_bin_size)
+
+        return cls(_histogram2d(ranges, means, counts, range_bin_edges,
+                                mean_bin_edges, sparse),
+                   mean_bin_edges, range_bin_edges)
+
+    @property
+    def shape(self) -> tuple:
+        return self.counts.shape
+
+    def toarray(self) -> np.ndarray:
+        """The dense counts."""
+        if isinstance(self.counts, SparseMatrix):
+            return self.counts.toarray()
+        return self.counts
+
+    @property
+    def mean_bins(self) -> np.ndarray:
+        """The centers of the mean bins."""
+        return (self.mean_bin_edges[1:] + self.mean_bin_edges[:-1]) / 2
+
+    @property
+    def range_bins(self) -> np.ndarray:
+        """The centers of the range bins."""
+        return (self.range_bin_edges[1:] + self.range_bin_edges[:-1]) / 2
+
+
+def mean_range_matrix(cycles, mean_bin_size, range_bin_size, sparse=False):
     """
-    Generates the mean-range matrix based on the input ``cycles`` matrix
+    Generates the mean-range matrix based on the input ``cycles`` table
     and mean and range bin sizes.
 
     Parameters
     ----------
-    cycles: np.ndarray
-        matrix formed after cycle extraction.
+    cycles: CycleTable
+        table formed after cycle extraction.
     mean_bin_size: float
         The bin size used to divide the ``mean`` values.
     range_bin_size: float
         The bin size used to divide the ``range`` values.
+    sparse: bool
+        Return a ``SparseMatrix``, whose ``toarray`` is the dense matrix.
 
     Returns
     -------
-    m_r_matrix : np.ndarray
-        The mean-range matrix.
+    m_r_matrix : np.ndarray or SparseMatrix
+        The mean-range matrix. Use ``MeanRangeMatrix.from_cycles`` to keep
+        the bin edges along with it, e.g. for ``damage``.
     """
 
-    global m_r_matrix, mean_bin_edges, range_bin_edges
+    return MeanRangeMatrix.from_cycles(cycles, mean_bin_size,
+                                       range_bin_size, sparse).counts
 
-    mean_bin_edges = np.arange(np.floor(np.amin(cycles[:, 0])),
-                               np.ceil(np.amax(cycles[:, 0])) + mean_bin_size,
-                               mean_bin_size)
-    range_bin_edges = np.arange(np.floor(np.amin(cycles[:, 1])),
-                                np.ceil(
-                                    np.amax(cycles[:, 1])) + range_bin_size,
-                                range_bin_size)
 
-    m_r_matrix = np.zeros((len(range_bin_edges) - 1, len(mean_bin_edges) - 1))
-    m = np.digitize(cycles[:, 0], mean_bin_edges, right=True) - 1
-    r = np.digitize(cycles[:, 1], range_bin_edges, right=True) - 1
-
-    for i in range(len(cycles)):
-        m_r_matrix[r[i], m[i]] += cycles[i, 2]
-
-    return m_r_matrix
-
-
-def from_to(cycles, from_bin_size, to_bin_size):
+def from_to(cycles, from_bin_size, to_bin_size, sparse=False):
     """
-    Generates the From-To matrix based on the input ``cycles`` matrix and
+    Generates the From-To matrix based on the input ``cycles`` table and
     **from** and **to** bin sizes.
 
     Parameters
     ----------
-    cycles: np.ndarray,
-        matrix formed after cycle extraction.
+    cycles: CycleTable
+        table formed after cycle extraction.
 
     from_bin_size: float
         The bin size used to divide the ``from`` values.
@@ -60,29 +207,166 @@ def from_to(cycles, from_bin_size, to_bin_size):
     to_bin_size: float
         The bin size used to divide the ``to`` values.
 
+    sparse: bool
+        Return a ``SparseMatrix``, whose ``toarray`` is the dense matrix.
+
     Returns
     -------
-    from_to_matrix: np.ndarray
+    from_to_matrix: np.ndarray or SparseMatrix
         The from-to matrix.
     """
 
-    from_bin_edges = np.arange(np.floor(np.amin(cycles[:, 3])),
-                               np.ceil(np.amax(cycles[:, 3])) + from_bin_size,
-                               from_bin_size)
-    to_bin_edges = np.arange(np.floor(np.amin(cycles[:, 4])),
-                             np.ceil(np.amax(cycles[:, 4])) + to_bin_size,
-                             to_bin_size)
+    peaks, valleys, counts = cycles.peak, cycles.valley, cycles.count
 
-    from_to_matrix = np.zeros((len(to_bin_edges) - 1, len(from_bin_edges) - 1))
-    t = np.digitize(cycles[:, 4], to_bin_edges, right=True) - 1
-    f = np.digitize(cycles[:, 3], from_bin_edges, right=True) - 1
-    for i in range(len(cycles)):
-        from_to_matrix[t[i], f[i]] += cycles[i, 2]
+    from_bin_edges = _bin_edges(peaks, from_bin_size)
+    to_bin_edges = _bin_edges(valleys, to_bin_size)
+
+    from_to_matrix = _histogram2d(valleys, peaks, counts, to_bin_edges,
+                                  from_bin_edges, sparse)
 
     return from_to_matrix
 
 
-def damage(material, k_t):
+class _GridAccumulator:
+    """
+    Counts of cycles on a fixed grid of (row, column) bins, binned like
+    ``mean_range_matrix`` and ``from_to``, see ``_bin_indices``: their
+    matrices with the edges of the grid count the cycles in the same
+    cells, including a cycle on the lowest edge, e.g. a valley of exactly
+    ``min_g``, which is in the last bin. The counts are a ``SparseMatrix``,
+    so memory follows the occupied cells rather than the grid, however
+    fine its bins.
+    """
+
+    def __init__(self, row_bin_edges, col_bin_edges):
+        self._row_bin_edges = row_bin_edges
+        self._col_bin_edges = col_bin_edges
+        self.counts = SparseMatrix(
+            np.zeros(0, dtype='int32'), np.zeros(0, dtype='int32'),
+            np.zeros(0), (len(row_bin_edges) - 1, len(col_bin_edges) - 1))
+        self.beyond = 0.  # counts of the cycles beyond the grid
+        self.flights = 0
+
+    def _add(self, row_values, col_values, counts):
+        indices = []
+        inside = np.ones(len(counts), dtype=bool)
+        for values, edges in ((row_values, self._row_bin_edges),
+                              (col_values, self._col_bin_edges)):
+            i = _bin_indices(values, edges)
+            inside &= (i >= 0) & (i < len(edges) - 1)
+            indices.append(i)
+
+        self.counts += SparseMatrix.from_indices(
+            *(i[inside] for i in indices), counts[inside], self.counts.shape)
+        self.beyond += counts[~inside].sum()
+        self.flights += 1
+
+    def merge(self, other):
+        """
+        Adds the counts accumulated by another accumulator with the same
+        grid.
+
+        :param other: accumulator of the same type
+        :return: None
+        """
+        if type(other) is not type(self) or \
+                not np.array_equal(other._row_bin_edges,
+                                   self._row_bin_edges) or \
+                not np.array_equal(other._col_bin_edges,
+                                   self._col_bin_edges):
+            raise ValueError('accumulators with different grids')
+        self.counts += other.counts
+        self.beyond += other.beyond
+        self.flights += other.flights
+
+
+class MeanRangeAccumulator(_GridAccumulator):
+    """
+    Mean-range matrix of a fleet on a fixed grid: means from ``min_g`` to
+    ``max_g`` and ranges from 0 to ``max_g - min_g``, rounded outwards to
+    whole g like the edges of ``mean_range_matrix``.
+
+    Flights are added one at a time and need not be kept; accumulators of
+    parts of the fleet, e.g. from parallel workers, are merged into one.
+    Cycles beyond the grid are not counted in the matrix but in
+    ``beyond``.
+    """
+
+    def __init__(self, mean_bin_size: float, range_bin_size: float,
+                 max_g: float = GRID_MAX_G, min_g: float = GRID_MIN_G):
+        """
+        :param mean_bin_size: The bin size of the means.
+        :param range_bin_size: The bin size of the ranges.
+        :param max_g: Highest mean of the grid.
+        :param min_g: Lowest mean of the grid.
+        """
+        self.mean_bin_edges = _grid_edges(min_g, max_g, mean_bin_size)
+        self.range_bin_edges = _grid_edges(0., max_g - min_g, range_bin_size)
+        super().__init__(self.range_bin_edges, self.mean_bin_edges)
+
+    def add(self, cycles):
+        """
+        Adds the cycles of a flight.
+
+        :param cycles: CycleTable
+        :return: None
+        """
+        self._add(cycles.range, cycles.mean, cycles.count)
+
+    def matrix(self, sparse=False) -> MeanRangeMatrix:
+        """
+        :param sparse: keep the counts as a ``SparseMatrix``
+        :return: the fleet mean-range matrix, with the edges of the grid
+        """
+        return MeanRangeMatrix(self.counts if sparse
+                               else self.counts.toarray(),
+                               self.mean_bin_edges, self.range_bin_edges)
+
+    def damage(self, material, k_t) -> float:
+        """
+        :return: the total damage of the fleet, see ``damage``
+        """
+        return damage(self.matrix(sparse=True), material, k_t)
+
+
+class FromToAccumulator(_GridAccumulator):
+    """
+    From-to matrix of a fleet on a fixed grid: peaks and valleys from
+    ``min_g`` to ``max_g``, rounded outwards to whole g like the edges of
+    ``from_to``. Accumulated like ``MeanRangeAccumulator``.
+    """
+
+    def __init__(self, from_bin_size: float, to_bin_size: float,
+                 max_g: float = GRID_MAX_G, min_g: float = GRID_MIN_G):
+        """
+        :param from_bin_size: The bin size of the peaks.
+        :param to_bin_size: The bin size of the valleys.
+        :param max_g: Highest peak of the grid.
+        :param min_g: Lowest valley of the grid.
+        """
+        self.from_bin_edges = _grid_edges(min_g, max_g, from_bin_size)
+        self.to_bin_edges = _grid_edges(min_g, max_g, to_bin_size)
+        super().__init__(self.to_bin_edges, self.from_bin_edges)
+
+    def add(self, cycles):
+        """
+        Adds the cycles of a flight.
+
+        :param cycles: CycleTable
+        :return: None
+        """
+        self._add(cycles.valley, cycles.peak, cycles.count)
+
+    def matrix(self, sparse=False):
+        """
+        :param sparse: return the ``SparseMatrix`` of the counts
+        :return: the fleet from-to matrix, one row per valley bin and one
+         column per peak bin
+        """
+        return self.counts if sparse else self.counts.toarray()
+
+
+def damage(m_r_matrix, material, k_t):
     """
     Determines a matrix the same shape as the mean-range matrix,
     the elements of which are the number of cycles-to-failure for a given
@@ -90,14 +374,10 @@ def damage(material, k_t):
     Dividing the mean-range matrix to this one, damage due to each type of
     cycles are determined and then summed based on Minor rule.
 
-    Important Note
-    ----------
-    This function must be called after the ``mean_range_matrix`` because
-    ``m_r_matrix``, ``mean_bin_edges`` and ``range_bin_edges`` are global
-    parameters which are defined in that function.
-
     Parameters
     ----------
+    m_r_matrix: MeanRangeMatrix
+        The mean-range matrix of the cycles, with its bin edges.
     material: str
         Name of the material, must exist in the material library.
     k_t: str
@@ -107,61 +387,150 @@ def damage(material, k_t):
     Returns
     -------
     damage: float
-        The total damage.
-    """
-
-    mean_bins = np.array(
-        [(i + j) / 2 for i, j in zip(mean_bin_edges[1:], mean_bin_edges[:-1])])
-    range_bins = np.array([(i + j) / 2 for i, j in
-                           zip(range_bin_edges[1:], range_bin_edges[:-1])])
-    N_matrix = np.zeros(m_r_matrix.shape)
-    a, b, c, d = material_lib.property_selector(material, k_t)
-
-    for i in range(N_matrix.shape[0]):
-        for j in range(N_matrix.shape[1]):
-            # TODO: the 200 factor is for generating positive argument in
-            #  the log function while acceleration signal is used instead
-            #  of the stress values. Should be removed when proper stress
-            #  calculation is done properly.
-            s_max = (mean_bins[j] + range_bins[i] / 2) * 200
-            s_min = (mean_bins[j] - range_bins[i] / 2) * 200
-
-            try:
-                r = s_min / s_max
-            except ValueError:
-                r = 0.
-
-            try:
-                s_eq = s_max * (1 - r) ** d
-            except ValueError:
-                r = 0.
-                s_eq = s_max * (1 - r) ** d
-
-            # TODO: the sign in the log argument must be negative log(s_eq - c)
-            N_matrix[i, j] = 10 ** (a - b * np.log(s_eq - c))
+        The total damage. Only the occupied cells are summed, so empty
+        cells of an invalid life (nan) are left out, however the counts are
+        stored.
+    """
+
+    counts = m_r_matrix.counts
+    if isinstance(counts, SparseMatrix):
+        key = _life_table_key(material, k_t, m_r_matrix.mean_bin_edges,
+                              m_r_matrix.range_bin_edges)
+        if key in _life_tables:  # the life table of the grid is kept
+            N_cells = life_table(material, k_t, m_r_matrix.mean_bin_edges,
+                                 m_r_matrix.range_bin_edges)[
+                counts.rows, counts.cols]
+        else:  # the life of the occupied cells only, not of the grid
+            N_cells = _cycles_to_failure(
+                m_r_matrix.mean_bins[counts.cols],
+                m_r_matrix.range_bins[counts.rows],
+                material_lib.property_selector(material, k_t))
+        return (counts.counts / N_cells).sum()
+
+    N_matrix = life_table(material, k_t, m_r_matrix.mean_bin_edges,
+                          m_r_matrix.range_bin_edges)
 
     # ==================== damage ====================
-    damage_matrix = m_r_matrix / N_matrix
-    return damage_matrix.sum()
+    occupied = counts > 0
+    return (counts[occupied] / N_matrix[occupied]).sum()
 
 
-def level_cross_count(signal: np.ndarray,
+def life_table(material, k_t, mean_bin_edges, range_bin_edges):
+    """
+    Number of cycles-to-failure of each cell of the mean-range matrices
+    with the given bin edges, see ``cycles_to_failure``. The tables are
+    cached per material, kₜ and bin edges, so flights sharing a grid only
+    compute theirs once, up to ``MAX_LIFE_TABLES_SIZE`` bytes: the least
+    recently used tables are dropped, and larger ones are not cached. The
+    sparse ``damage`` uses the cached tables too, or computes the occupied
+    cells only.
+
+    Parameters
+    ----------
+    material: str
+        Name of the material, must exist in the material library.
+    k_t: str
+        The kₜ of the material.
+    mean_bin_edges: np.ndarray
+        The edges of the mean bins.
+    range_bin_edges: np.ndarray
+        The edges of the range bins.
+
+    Returns
+    -------
+    N_matrix: np.ndarray
+        Read-only matrix the shape of the mean-range matrix.
+    """
+
+    key = _life_table_key(material, k_t, mean_bin_edges, range_bin_edges)
+    N_matrix = _life_tables.get(key)
+    if N_matrix is not None:
+        _life_tables.move_to_end(key)
+        return N_matrix
+
+    mean_bin_edges = np.frombuffer(key[2])
+    range_bin_edges = np.frombuffer(key[3])
+    N_matrix = cycles_to_failure(
+        (mean_bin_edges[1:] + mean_bin_edges[:-1]) / 2,
+        (range_bin_edges[1:] + range_bin_edges[:-1]) / 2,
+        material_lib.property_selector(material, k_t))
+    N_matrix.flags.writeable = False  # shared by the callers
+
+    if N_matrix.nbytes <= MAX_LIFE_TABLES_SIZE:
+        _life_tables[key] = N_matrix
+        total = sum(table.nbytes for table in _life_tables.values())
+        while total > MAX_LIFE_TABLES_SIZE:
+            total -= _life_tables.popitem(last=False)[1].nbytes
+    return N_matrix
+
+
+def cycles_to_failure(mean_bins, range_bins, properties):
+    """
+    Number of cycles-to-failure of the cycles of each mean and range,
+    computed over all the cells of the mean-range matrix at once.
+
+    Parameters
+    ----------
+    mean_bins: np.ndarray
+        The centers of the mean bins, the columns of the matrix.
+    range_bins: np.ndarray
+        The centers of the range bins, the rows of the matrix.
+    properties: list
+        The ``a, b, c, d`` values of the material, see
+        ``material_lib.property_selector``.
+
+    Returns
+    -------
+    N_matrix: np.ndarray
+        Matrix the shape of the mean-range matrix.
+    """
+
+    return _cycles_to_failure(np.asarray(mean_bins).reshape((1, -1)),
+                              np.asarray(range_bins).reshape((-1, 1)),
+                              properties)
+
+
+def _cycles_to_failure(means, ranges, properties):
+    """Cycles-to-failure of each pair of mean and range, broadcast."""
+    a, b, c, d = properties
+
+    # TODO: the 200 factor is for generating positive argument in
+    #  the log function while acceleration signal is used instead
+    #  of the stress values. Should be removed when proper stress
+    #  calculation is done properly.
+    s_max = (means + ranges / 2) * 200
+    s_min = (means - ranges / 2) * 200
+
+    # invalid cells, e.g. a zero maximum stress, are nan or inf
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = s_min / s_max
+        s_eq = s_max * (1 - r) ** d
+
+        # TODO: the sign in the log argument must be negative log(s_eq - c)
+        return 10 ** (a - b * np.log(s_eq - c))
+
+
+def _life_table_key(material, k_t, mean_bin_edges, range_bin_edges):
+    return (material, k_t,
+            np.asarray(mean_bin_edges, dtype='float64').tobytes(),
+            np.asarray(range_bin_edges, dtype='float64').tobytes())
+
+
+def level_cross_count(cycles,
                       level_width: float,
                       base_g: float = 1.) -> (
         list, list, np.ndarray, np.ndarray):
     """
-    Counts the level crossing given a baseline, resolution, and an ``(n ×
-    3)`` array containing counts, max and min of each cycle type. This
-    array is the last three columns of the array generated by the
-    ``rainflow.extract_cycles`` function.
+    Counts the level crossing given a baseline, resolution, and the table
+    of cycles generated by rainflow counting. Same as
+    ``level_crossing.level_cross_count``.
 
     Parameters
     ---------
-    signal:
-        ``(n × 3)`` array. Each row represents a type of cycle. First
-        column is the counts of that cycle type, resulted from rainflow
-        counting. Second column is the maximum value of that cycle family
-        and the third column is the minimum value of that cycle family.
+    cycles: CycleTable
+        Each row represents a type of cycle. Its counts, resulted from
+        rainflow counting, the maximum value (peak) and the minimum value
+        (valley) of that cycle family are used.
 
     level_width:
         Width of the desired levels.
@@ -176,57 +545,50 @@ def level_cross_count(signal: np.ndarray,
         arrays containing the counts of each bin above and below baseline.
     """
 
-    # largest and smallest signals
-    max_signal = max(signal[:, 1])
-    min_signal = min(signal[:, 2])
-
-    if (max_signal - base_g) % level_width != 0.0:  # intervals above baseline
-        top_intervals = ceil((max_signal - base_g) / level_width)
-    else:  # reversal exactly on a bin border
-        top_intervals = ceil((max_signal - base_g) / level_width) + 1
-
-    if (min_signal - base_g) % level_width != 0.0:  # intervals below baseline
-        bottom_intervals = int(abs(floor((min_signal - base_g) / level_width)))
-    else:  # reversal exactly on a bin border
-        bottom_intervals = int(
-            abs(floor((min_signal - base_g) / level_width))) + 1
-
-    # initiate counters and binners
-    top_counts = np.zeros(top_intervals)
-    bottom_counts = np.zeros(bottom_intervals)
-    top_bins = [round(base_g + level_width * (2 * i + 1) / 2, 5) for i in
-                range(top_intervals)]
-    bottom_bins = [round(base_g - level_width * (2 * i + 1) / 2, 5) for i in
-                   range(bottom_intervals)]
-
-    for n, peak, valley in signal:
-
-        # exclude head and tail
-        # if k == 0 or k == len(signal) - 1:
-        #     continue
-
-        # count peaks
-        if peak >= base_g:  # if above baseline
-            i = 0
-            while peak >= base_g + i * level_width:
-                i += 1
-            top_counts[:i] += n
-        else:  # if below baseline
-            i = 0
-            while peak <= base_g - i * level_width:
-                i += 1
-            bottom_counts[:i] += n
-
-        # count valleys
-        if valley >= base_g:  # if above baseline
-            i = 0
-            while valley >= base_g + i * level_width:
-                i += 1
-            top_counts[:i] += n
-        else:  # if below baseline
-            i = 0
-            while valley <= base_g - i * level_width:
-                i += 1
-            bottom_counts[:i] += n
-
-    return top_bins, bottom_bins, top_counts, bottom_counts
+    return level_crossing.level_cross_count(cycles, level_width, base_g)
+
+
+def _bin_edges(values, bin_size):
+    """
+    Edges of the bins from the floor of the lowest value to the ceiling of
+    the highest one.
+    """
+    return np.arange(np.floor(np.amin(values)),
+                     np.ceil(np.amax(values)) + bin_size, bin_size)
+
+
+def _grid_edges(lowest, highest, bin_size):
+    """
+    Edges of the bins of a fixed grid, from the floor of ``lowest`` to the
+    ceiling of ``highest``.
+    """
+    return _bin_edges([lowest, highest], bin_size)
+
+
+def _bin_indices(values, edges):
+    """
+    Index of the bin of each value. The bins are closed on the right, and
+    a value on the lowest edge is counted in the last bin, as when the
+    matrix is indexed with the ``np.digitize(..., right=True) - 1`` of the
+    values. Values below the lowest edge are at -1, above the highest one
+    at ``len(edges) - 1``.
+    """
+    i = np.digitize(values, edges, right=True) - 1
+    i[values == edges[0]] = len(edges) - 2
+    return i
+
+
+def _histogram2d(row_values, col_values, counts, row_edges, col_edges,
+                 sparse=False):
+    """
+    Sums the counts of the values in each (row, column) bin in a single
+    pass, into a dense matrix or a ``SparseMatrix``, see ``_bin_indices``.
+    """
+    shape = (len(row_edges) - 1, len(col_edges) - 1)
+    r = _bin_indices(row_values, row_edges)
+    c = _bin_indices(col_values, col_edges)
+    if sparse:
+        return SparseMatrix.from_indices(r, c, counts, shape)
+    flat = np.ravel_multi_index((r, c), shape)
+    return np.bincount(flat, counts, minlength=shape[0] * shape[1]) \
+        .reshape(shape)
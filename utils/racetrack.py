@@ -0,0 +1,305 @@
+"""
+Racetrack amplitude filter, applied to a signal fed chunk by chunk.
+
+The filter follows ``fatpack.find_reversals_racetrack_filtered``: the signal
+is classified into ``k`` load classes and peak-valley filtered, the
+reversals are racetrack filtered with the width ``h`` and the remaining
+points are classified and peak-valley filtered again. For the same ``h``
+and ``k`` the results are identical to fatpack's.
+
+The second classification spans the range of all the racetrack filtered
+points, so with ``k`` load classes the filter is not incremental: these
+points are held until the signal ends. Only with ``k=None`` does it stream
+the reversals with a memory bound by the chunks.
+"""
+import numpy as np
+
+# most values whose racetrack positions are composed at once by `_play`,
+# and values filtered one at a time where the composition fails
+_PLAY_BLOCK = 1 << 14
+_PLAY_LOOP = 256
+
+
+class RacetrackFilter:
+    def __init__(self, h, k=200, ymin=None, ymax=None):
+        """
+        Filter of the cycles with a range lower than ``h`` out of a signal
+        fed with ``update`` and closed with ``finalize``.
+
+        The load classes span the range of the whole signal, so it must be
+        given as ``ymin`` and ``ymax`` when the signal is fed in chunks.
+        The last classification spans the range of the racetrack filtered
+        points, only known at the end, so with ``k`` the filter is not
+        incremental: the racetrack filtered points of the whole signal are
+        kept until ``finalize``, which returns all the reversals, and the
+        memory used grows with the signal. Only the first passes are done
+        chunk by chunk. With ``k=None`` the signal is not classified and
+        the reversals are returned by each update as soon as they are
+        confirmed, keeping only a few points between updates.
+
+        :param h: float Racetrack width.
+        :param k: int Number of load classes, or ``None``.
+        :param ymin: float Minimum of the signal.
+        :param ymax: float Maximum of the signal.
+        """
+        if k is not None and (ymin is None or ymax is None):
+            raise ValueError('the range of the signal, ymin and ymax, is '
+                             'needed to classify it into load classes')
+        self.h = h
+        self.k = k
+        self.samples = 0  # signal samples fed so far
+
+        classify = None if k is None else _load_classifier(ymin, ymax, k)
+        self._peak_valley = _PeakValley(classify)
+
+        # the last reversal is always kept by the racetrack filter, so it
+        # stays pending until the next one comes
+        self._pending = None  # value and index of the last reversal
+        self._previous = None  # racetrack position, None before the first
+
+        self._final = _PeakValley() if k is None else None
+        self._kept = []  # racetrack filtered points, if classified later
+        self._finalized = False
+
+    def update(self, chunk: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        Filters the next chunk of the signal.
+
+        :param chunk: 1D array, the samples following the previous chunk
+        :return: values and signal indices of the filtered reversals
+         confirmed by the chunk, always empty if the signal is classified
+        """
+        if self._finalized:
+            raise ValueError('the filter is already finalized')
+
+        y = np.asarray(chunk, dtype='float64').reshape(-1)
+        indices = np.arange(self.samples, self.samples + len(y))
+        self.samples += len(y)
+
+        values, indices = self._peak_valley.update(y, indices)
+        return self._second_pass(*self._racetrack(values, indices))
+
+    def finalize(self) -> (np.ndarray, np.ndarray):
+        """
+        Closes the signal: its last reversal is always kept.
+
+        :return: values and signal indices of the remaining filtered
+         reversals
+        """
+        if self._finalized:
+            raise ValueError('the filter is already finalized')
+        self._finalized = True
+
+        values, indices = self._racetrack(*self._peak_valley.finalize(),
+                                          last=True)
+        if self._final is not None:
+            return _join(self._final.update(values, indices),
+                         self._final.finalize())
+
+        self._kept.append((values, indices))
+        values, indices = map(np.concatenate, zip(*self._kept))
+        self._kept = []
+        if not len(values):
+            return values, indices
+
+        second = _PeakValley(_load_classifier(values.min(), values.max(),
+                                              self.k))
+        return _join(second.update(values, indices), second.finalize())
+
+    def _racetrack(self, values, indices, last=False):
+        """
+        Keeps the reversals deviating more than ``h / 2`` from the
+        racetrack position; the first and the last ones are always kept.
+        """
+        if self._pending is not None:
+            values = np.r_[self._pending[0], values]
+            indices = np.r_[self._pending[1], indices]
+        if not len(values):
+            return values, indices.astype('int64')
+        if not last:  # may be the last reversal
+            self._pending = values[-1], indices[-1]
+            values, indices = values[:-1], indices[:-1]
+
+        keep = np.zeros(len(values), dtype=bool)
+        previous, first = self._previous, 0
+        if previous is None and len(values):  # first reversal
+            previous, first = values[0], 1
+            keep[0] = True
+        keep[first:], self._previous = _play(values[first:], previous,
+                                             self.h / 2.)
+        if last and len(values):
+            keep[-1] = True
+
+        return values[keep], indices[keep].astype('int64')
+
+    def _second_pass(self, values, indices):
+        if self._final is not None:
+            return self._final.update(values, indices)
+        self._kept.append((values, indices))
+        return np.empty(0), np.empty(0, dtype='int64')
+
+
+def find_reversals_racetrack_filtered(y: np.ndarray, h: float,
+                                      k: int = 200) -> (np.ndarray,
+                                                        np.ndarray):
+    """
+    Racetrack filtered reversals of a whole signal, identical to
+    ``fatpack.find_reversals_racetrack_filtered(y, h, k)``.
+
+    :param y: 1D array
+    :param h: racetrack width
+    :param k: number of load classes, or ``None`` not to classify
+    :return: values and indices of the filtered reversals
+    """
+    y = np.asarray(y, dtype='float64').reshape(-1)
+    if k is None:
+        racetrack = RacetrackFilter(h, None)
+    else:
+        racetrack = RacetrackFilter(h, k, y.min(), y.max())
+    return _join(racetrack.update(y), racetrack.finalize())
+
+
+def _play(values, previous, half):
+    """
+    Racetrack filter of reversals: a value is kept if it deviates more than
+    ``half`` from the racetrack position, which then moves to ``half`` from
+    it, towards the previous position.
+
+    Moving the position within ``half`` of a value is clipping it into
+    ``[y - half, y + half]``, and clips compose into a clip, so the
+    positions are found by composing the clips of a window of values in
+    ``log2`` vectorized steps. Where a value lies ``half`` from the
+    position, within rounding, the clip and fatpack's test may disagree,
+    e.g. on signals recorded with few decimals: fatpack's loop then filters
+    the next values, ``_PLAY_LOOP`` at first and twice as many each time
+    the window after them fails again.
+
+    :param values: reversal values
+    :param previous: racetrack position before the first value
+    :param half: half the racetrack width
+    :return: the values kept, boolean array, and the last position
+    """
+    keep = np.zeros(len(values), dtype=bool)
+    start, size, loop = 0, _PLAY_BLOCK, _PLAY_LOOP
+    while start < len(values):
+        y = values[start:start + size]
+        low, high = y - half, y + half
+        # clip of the values up to each one: the clip of the values up to
+        # `step` before it, clipped by its own and those in between
+        step = 1
+        while step < len(y):
+            low[step:], high[step:] = (np.clip(low[:-step], low[step:],
+                                               high[step:]),
+                                       np.clip(high[:-step], low[step:],
+                                               high[step:]))
+            step *= 2
+        after = np.clip(previous, low, high)
+        before = np.r_[previous, after[:-1]]
+
+        # fatpack's test, `abs(dy) > half`, against the clip
+        moved = np.abs(y - before) > half
+        differ = np.flatnonzero(moved != (after != before))
+        n = differ[0] if len(differ) else len(y)
+        keep[start:start + n] = moved[:n]
+        if n == len(y):
+            previous = after[-1]
+            start, size = start + n, min(2 * size, _PLAY_BLOCK)
+            loop = _PLAY_LOOP
+            continue
+
+        stop = min(start + n + loop, len(values))
+        keep[start + n:stop], previous = _play_loop(
+            values[start + n:stop], before[n], half)
+        start, size = stop, max(2 * n, _PLAY_LOOP)
+        loop = min(2 * loop, _PLAY_BLOCK)
+
+    return keep, previous
+
+
+def _play_loop(values, previous, half):
+    """
+    ``_play`` one value at a time, the way fatpack does.
+    """
+    keep = np.zeros(len(values), dtype=bool)
+    kept = memoryview(keep)
+    for n, yn in enumerate(values.tolist()):
+        dy = yn - previous
+        if abs(dy) > half:
+            previous = yn - dy / abs(dy) * half
+            kept[n] = True
+    return keep, previous
+
+
+def _load_classifier(ymin, ymax, k):
+    """
+    Returns the function mapping values to the middle of their load class,
+    with the ``k + 1`` classes of ``fatpack.find_reversals``.
+    """
+    dy = (ymax - ymin) / (2.0 * k)
+    boundaries = np.linspace(ymin - dy, ymax + dy, k + 2)
+    d_class = boundaries[1] - boundaries[0]
+
+    def classify(y):
+        i = np.digitize(y, boundaries)
+        return boundaries[0] + d_class / 2. + (i - 1) * d_class
+
+    return classify
+
+
+class _PeakValley:
+    """
+    Peak-valley filter of a stream of points, the way
+    ``fatpack.find_reversals`` filters a whole series: runs of points of
+    the same (classified) value are merged, the end of the first run and
+    of every run where the slope changes sign are reversals, and so is the
+    start of the last run.
+    """
+
+    def __init__(self, classify=None):
+        self.classify = classify
+        self._prev = None  # classified value preceding the current run
+        self._current = None  # classified value of the current run
+        self._last = None  # value and index of the last point
+        self._start = None  # value and index of the current run's start
+        self._first = True  # the end of the first run is not found yet
+
+    def update(self, y, indices):
+        if not len(y):
+            return np.empty(0), np.empty(0, dtype='int64')
+        z = y if self.classify is None else self.classify(y)
+
+        # prepend the pending runs to the chunk
+        head = [v for v in (self._prev, self._current) if v is not None]
+        z = np.r_[head, z]
+        if head:
+            y = np.r_[[np.nan] * (len(head) - 1), self._last[0], y]
+            indices = np.r_[[-1] * (len(head) - 1), self._last[1], indices]
+
+        starts = np.r_[0, np.flatnonzero(np.diff(z)) + 1]
+        slopes = np.diff(z[starts])
+        k = np.flatnonzero(slopes[:-1] * slopes[1:] < 0) + 1
+
+        ends = starts[k + 1] - 1  # a reversal is the end of its run
+        if self._first and len(starts) > 1:
+            ends = np.r_[starts[1] - 1, ends]
+            self._first = False
+
+        if starts[-1] >= len(head):  # the current run starts in the chunk
+            self._start = y[starts[-1]], indices[starts[-1]]
+        self._prev = z[starts[-2]] if len(starts) > 1 else None
+        self._current = z[-1]
+        self._last = y[-1], indices[-1]
+
+        return y[ends], indices[ends].astype('int64')
+
+    def finalize(self):
+        if self._start is None:  # no point at all
+            return np.empty(0), np.empty(0, dtype='int64')
+        # the start of the last run, or the first point of a single run
+        return np.array([self._start[0]]), \
+            np.array([self._start[1]], dtype='int64')
+
+
+def _join(*parts):
+    values, indices = zip(*parts)
+    return np.concatenate(values), np.concatenate(indices).astype('int64')
@@ -0,0 +1,238 @@
+"""
+Rainflow cycle counting according to ASTM E1049-85, on NumPy arrays.
+
+The reversals of the signal are found with vectorized operations and the
+cycles are counted on the reversal array with a stack of indices, writing
+straight into preallocated arrays. The results are identical, cycle for
+cycle, to ``rainflow.extract_cycles``. ``IncrementalCounter`` gives the same
+cycles from a signal fed chunk by chunk.
+"""
+import numpy as np
+
+# fields of the cycle table returned by `extract_cycles`
+CYCLE_DTYPE = np.dtype([('range', 'f8'), ('mean', 'f8'), ('count', 'f8'),
+                        ('peak', 'f8'), ('valley', 'f8'),
+                        ('start', 'i8'), ('end', 'i8')])
+
+
+def find_reversals(signal: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    Finds the points of the signal where its slope changes sign. Repeated
+    values count as a single point. The first and the last points are
+    always included.
+
+    :param signal: 1D array
+    :return: values and indices of the reversals
+    """
+    x = np.asarray(signal, dtype='float64').reshape(-1)
+    n = len(x)
+    if n < 3:  # no slope change can be detected
+        return x[:1].copy(), np.zeros(min(n, 1), dtype='int64')
+
+    # distinct points: where the value differs from the previous sample
+    points = np.r_[0, np.flatnonzero(np.diff(x)) + 1]
+    slopes = np.diff(x[points])
+    k = np.flatnonzero(slopes[:-1] * slopes[1:] < 0) + 1
+
+    # a reversal is located at the last sample of a plateau
+    indices = np.r_[0, points[k + 1] - 1, n - 1]
+    values = np.r_[x[0], x[points[k]], x[-1]]
+
+    return values, indices
+
+
+def count_reversals(values: np.ndarray, indices: np.ndarray) -> np.ndarray:
+    """
+    Counts the rainflow cycles of a sequence of reversals.
+
+    :param values: reversal values, as returned by ``find_reversals``
+    :param indices: signal indices of the reversals
+    :return: structured array of ``CYCLE_DTYPE``, one row per cycle
+    """
+    return _count(values, indices, 0, close=True)[0]
+
+
+def _count(values, indices, n_residue: int, close: bool):
+    """
+    Counts the rainflow cycles of a sequence of reversals whose first
+    ``n_residue`` points are the residue of a previous count, i.e. the
+    stack left unresolved by it.
+
+    :param values: reversal values, residue first
+    :param indices: signal indices of the reversals, residue first
+    :param n_residue: number of residue points
+    :param close: count the ranges left on the stack as half cycles
+    :return: structured array of ``CYCLE_DTYPE`` and the positions in
+     ``values`` of the new residue
+    """
+    x = np.asarray(values, dtype='float64').tolist()
+
+    # at most one cycle less than the number of reversals
+    size = max(len(x) - 1, 0)
+    first = np.empty(size, dtype='int64')
+    second = np.empty(size, dtype='int64')
+    count = np.empty(size, dtype='float64')
+    f, s, n = memoryview(first), memoryview(second), memoryview(count)
+
+    c = 0
+    # indices and values of unresolved reversals
+    stack, stack_x = list(range(n_residue)), x[:n_residue]
+    for j in range(n_residue, len(x)):
+        x3 = x[j]
+        while len(stack) >= 2:
+            # ranges X and Y from the three most recent points
+            x2 = stack_x[-1]
+            if abs(x3 - x2) < abs(x2 - stack_x[-2]):
+                break  # read the next point
+            elif len(stack) == 2:
+                # Y contains the starting point: count a half cycle and
+                # discard the first point
+                f[c], s[c], n[c] = stack[0], stack[1], .5
+                del stack[0], stack_x[0]
+            else:
+                # count Y as a full cycle and discard its peak and valley
+                f[c], s[c], n[c] = stack[-2], stack[-1], 1.
+                del stack[-2:], stack_x[-2:]
+            c += 1
+        stack.append(j)
+        stack_x.append(x3)
+
+    if close:
+        # the remaining ranges are half cycles
+        for a, b in zip(stack[:-1], stack[1:]):
+            f[c], s[c], n[c] = a, b, .5
+            c += 1
+        stack = []
+
+    values = np.asarray(values, dtype='float64')
+    indices = np.asarray(indices)
+    x1, x2 = values[first[:c]], values[second[:c]]
+
+    cycles = np.empty(c, dtype=CYCLE_DTYPE)
+    cycles['range'] = np.abs(x1 - x2)
+    cycles['mean'] = .5 * (x1 + x2)
+    cycles['count'] = count[:c]
+    cycles['peak'] = np.maximum(x1, x2)
+    cycles['valley'] = np.minimum(x1, x2)
+    cycles['start'] = indices[first[:c]]
+    cycles['end'] = indices[second[:c]]
+
+    return cycles, np.array(stack, dtype='int64')
+
+
+class IncrementalCounter:
+    """
+    Rainflow counter fed with a signal, or its reversals, chunk by chunk.
+
+    Only the unresolved residue is kept between chunks: the last two
+    distinct values of the signal, to detect the reversals, and the stack
+    of reversals not closed into cycles yet. Each update returns the cycles
+    the chunk closed; ``finalize`` closes the residue. Put together, they
+    are identical, cycle for cycle and in the same order, to
+    ``extract_cycles`` (or ``count_reversals``) applied to the whole
+    signal.
+
+    Feed either signal chunks with ``update`` or reversal chunks with
+    ``update_reversals``, not both.
+    """
+
+    def __init__(self):
+        self.samples = 0  # signal samples fed so far
+        self._prev = None  # distinct value preceding the last one
+        self._last = None  # last distinct value of the signal
+        self._values = np.empty(0)  # residue stack
+        self._indices = np.empty(0, dtype='int64')
+        self._finalized = False
+
+    def update(self, chunk: np.ndarray) -> np.ndarray:
+        """
+        Counts the cycles closed by the next chunk of the signal.
+
+        :param chunk: 1D array, the samples following the previous chunk
+        :return: structured array of ``CYCLE_DTYPE``, with signal indices
+         counted from the start of the first chunk
+        """
+        return self.update_reversals(*self._reversals(chunk))
+
+    def update_reversals(self, values: np.ndarray,
+                         indices: np.ndarray) -> np.ndarray:
+        """
+        Counts the cycles closed by the next chunk of reversals.
+
+        :param values: reversal values
+        :param indices: signal indices of the reversals
+        :return: structured array of ``CYCLE_DTYPE``
+        """
+        if self._finalized:
+            raise ValueError('the counter is already finalized')
+        return self._push(values, indices, close=False)
+
+    def finalize(self) -> np.ndarray:
+        """
+        Closes the residue: the last sample of the signal is the last
+        reversal and the ranges left on the stack are half cycles.
+
+        :return: structured array of ``CYCLE_DTYPE``
+        """
+        if self._finalized:
+            raise ValueError('the counter is already finalized')
+        self._finalized = True
+
+        # the last sample is a reversal, unless the signal is too short
+        # to have any slope change (see `find_reversals`)
+        if self.samples >= 3:
+            return self._push([self._last], [self.samples - 1], close=True)
+        return self._push([], [], close=True)
+
+    def _push(self, values, indices, close: bool) -> np.ndarray:
+        n_residue = len(self._values)
+        values = np.r_[self._values, np.asarray(values, dtype='float64')]
+        indices = np.r_[self._indices, np.asarray(indices, dtype='int64')]
+
+        cycles, residue = _count(values, indices, n_residue, close)
+        self._values, self._indices = values[residue], indices[residue]
+        return cycles
+
+    def _reversals(self, chunk: np.ndarray) -> (np.ndarray, np.ndarray):
+        """
+        Finds the reversals confirmed by ``chunk``, as ``find_reversals``
+        would on the whole signal. The last distinct value stays pending
+        until a later sample shows whether the slope changes sign there.
+        """
+        x = np.asarray(chunk, dtype='float64').reshape(-1)
+        if not len(x):
+            return np.empty(0), np.empty(0, dtype='int64')
+
+        # prepend the pending values to the chunk
+        head = [v for v in (self._prev, self._last) if v is not None]
+        x = np.r_[head, x]
+        offset = self.samples - len(head)  # signal index of x[0]
+
+        points = np.r_[0, np.flatnonzero(np.diff(x)) + 1]
+        slopes = np.diff(x[points])
+        k = np.flatnonzero(slopes[:-1] * slopes[1:] < 0) + 1
+
+        # a reversal is located at the last sample of a plateau
+        indices = points[k + 1] - 1 + offset
+        values = x[points[k]]
+        if not self.samples:  # the first point is always a reversal
+            indices, values = np.r_[0, indices], np.r_[x[0], values]
+
+        distinct = x[points[-2:]]
+        self._prev = distinct[0] if len(distinct) == 2 else None
+        self._last = distinct[-1]
+        self.samples += len(x) - len(head)
+
+        return values, indices
+
+
+def extract_cycles(signal: np.ndarray) -> np.ndarray:
+    """
+    Extracts the rainflow cycles of a signal.
+
+    :param signal: 1D array
+    :return: structured array of ``CYCLE_DTYPE`` with the range, mean,
+     count (1 for full and 0.5 for half cycles), peak, valley and the
+     signal indices of the start and end of each cycle
+    """
+    return count_reversals(*find_reversals(signal))
@@ -1,12 +1,18 @@
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
-import fatpack
 import numpy as np
 from matplotlib import pyplot as plt
 
-from utils import GUI, get_data_np, graphs, level_crossing, matrices
-import rainflow
+from utils import GUI, get_data_np, graphs, level_crossing, matrices, \
+    racetrack, rainflow_kernel, stage_cache, summary_store
+from utils.catalog import FlightCatalog, catalog_path
+from utils.cycle_table import CycleTable
+from utils.exceedance import GRID_MAX_G, GRID_MIN_G, Exceedance, \
+    ExceedanceAccumulator
+from utils.summary_store import SummaryStore
+from utils.validation import FlightRejected, ValidationRules
 from datetime import datetime
 
 # logger setup
@@ -14,13 +20,17 @@ from utils.loggers import MyLog
 
 logger = MyLog().logger
 
+# number of flight exceedances merged into the fleet exceedance at once
+_MERGE_BATCH = 32
+
 
 class RainFlowCounter:
     def __init__(self, file_path,
                  mean_bin_size, range_bin_size,
                  material, k_t, g_exc_bin_size,
-                 racetrack_filter=True, h=0.1,
-                 verbose=False):
+                 racetrack_filter=True, h=0.1, k=200,
+                 verbose=False, cache_dir=None, rules=None,
+                 exceedance_only=False, hash_file=False):
         self.verbose = verbose
         self.racetrack_filter = racetrack_filter,
         self.file_path = file_path
@@ -29,113 +39,213 @@ class RainFlowCounter:
         self.material = material
         self.k_t = k_t
         self.gExc_bin_size = g_exc_bin_size
-
-        # load data
+        self._mean_range = {}  # mean-range matrices per bin sizes
+
+        # the reversals and the cycles do not depend on the bin sizes nor
+        # the material: they are cached by file content and stage parameters
+        # (bump `stage_cache.STAGE_VERSIONS` when their arrays change)
+        rules = ValidationRules() if rules is None else rules
+        self.params = params = dict(rules=vars(rules),
+                                    racetrack_filter=bool(racetrack_filter),
+                                    h=h if racetrack_filter else None,
+                                    k=k if racetrack_filter else None)
+        # the hash of the file content identifies the flight, in the stage
+        # cache and in the summary store
+        stages = self.file_hash = None
+        if cache_dir is not None or hash_file:
+            self.file_hash = stage_cache.content_hash(self.file_path)
+        if cache_dir is not None:
+            stages = os.path.join(cache_dir, stage_cache.STAGES_DIR)
+
+        # load data, stopping at the first chunk which breaks a validation
+        # rule (by default, Nz higher than 3.5g), and filter it
         t0 = datetime.now()
-        self.tt, self.nz = get_data_np.get_data(self.file_path, [7])
-        self.nz = np.array(self.nz).reshape(-1)
+        reversals = None
+        if stages is not None:
+            reversals = stage_cache.load(stages, self.file_hash, 'reversals',
+                                         params)
+        if reversals is not None:
+            self.tt, self.nz = reversals['tt'], reversals['nz']
+            self.duration, self.nz_min, self.nz_max = reversals['stats']
+            self.first_time = reversals['first_time'][()]
+        else:
+            self.tt, self.nz = get_data_np.get_data(
+                self.file_path, [7], cache_dir=cache_dir, rules=rules)
+            self.nz = np.array(self.nz).reshape(-1)
+            # the flight before filtering
+            self.duration = (self.tt[-1] - self.tt[0]).item()
+            self.nz_min, self.nz_max = self.nz.min(), self.nz.max()
+            try:  # `tt` only holds the time from the first record
+                self.first_time = get_data_np.first_timestamp(self.file_path)
+            except ValueError:  # the timestamps are not fixed width
+                self.first_time = np.datetime64('NaT', 'us')
+
+            # filter data
+            if racetrack_filter:
+                self.nz, ix = racetrack.find_reversals_racetrack_filtered(
+                    self.nz, h=h, k=k)
+                self.tt = self.tt[ix]
+
+            if stages is not None:
+                stage_cache.store(stages, self.file_hash, 'reversals', params,
+                                  dict(tt=self.tt, nz=self.nz,
+                                       stats=[self.duration, self.nz_min,
+                                              self.nz_max],
+                                       first_time=self.first_time))
 
         if verbose:
             logger.info(
                 f'\t▪ Data successfully loaded in '
                 f'{round((datetime.now() - t0).total_seconds(), 3)} s.')
 
-        # check if Nz is higher than 3.5g
-        self.invalid_data = False
-        if np.partition(self.nz, 1)[-1:] > 3.5:
-            self.invalid_data = True
-
-        # filter data
-        if racetrack_filter:
-            self.nz, ix = fatpack.find_reversals_racetrack_filtered(
-                self.nz, h=h, k=200)
-            self.tt = self.tt[ix]
-
-        # extract cycles and their properties - (n, 5)
-        # - columns = [mean, range, count, start, end]
-        cyc_prop = {
-            'cyc_mean': [], 'cyc_range': [], 'cyc_count': [],
-            'start_i': [], 'end_i': [],
-            'peak': [], 'valley': []
-        }
-
+        if exceedance_only:
+            # the level crossings of the cycles follow from the reversals
+            self.cycles = None
+            t0 = datetime.now()
+            self.top_bins, self.bottom_bins, self.top_counts, \
+                self.bottom_counts = level_crossing.reversal_cross_count(
+                    self.nz, self.gExc_bin_size)
+            self.exceedance = Exceedance.from_reversals(self.nz)
+            if verbose:
+                logger.info(
+                    f'\t▪ Level-crossings successfully calculated from the '
+                    f'reversals in '
+                    f'{round((datetime.now() - t0).total_seconds(), 3)} s.\n')
+            return
+
+        # extract cycles and their properties into a compact table
+        # - columns = mean, range, count, peak, valley
         t0 = datetime.now()
-        for rg, mn, c, i_s, i_e in rainflow.extract_cycles(
-                self.nz):  # this is a generator
-            cyc_prop['cyc_mean'].append(mn)
-            cyc_prop['cyc_range'].append(rg)
-            cyc_prop['cyc_count'].append(c)
-            cyc_prop['start_i'].append(self.nz[i_s])
-            cyc_prop['end_i'].append(self.nz[i_e])
-            cyc_prop['peak'].append(mn + rg / 2)
-            cyc_prop['valley'].append(mn - rg / 2)
+        cycles = None
+        if stages is not None:
+            cycles = stage_cache.load(stages, self.file_hash, 'cycles', params)
+        if cycles is not None:
+            self.cycles = CycleTable(cycles['cycles'])
+        else:
+            self.cycles = CycleTable.from_cycles(
+                rainflow_kernel.extract_cycles(self.nz))
+            if stages is not None:
+                stage_cache.store(stages, self.file_hash, 'cycles', params,
+                                  dict(cycles=self.cycles.data))
+
         if verbose:
             logger.info(
                 f'\t▪ Load cycles successfully extracted in '
                 f'{round((datetime.now() - t0).total_seconds(), 3)} s.')
 
-        self.cycles = np.column_stack(
-            (cyc_prop['cyc_mean'], cyc_prop['cyc_range'],
-             cyc_prop['cyc_count'], cyc_prop['peak'], cyc_prop['valley']))
-
         # ==================== level cross counting ====================
         t0 = datetime.now()
         self.top_bins, self.bottom_bins, self.top_counts, self.bottom_counts \
-            = level_crossing.level_cross_count(self.cycles[:, 2:],
+            = level_crossing.level_cross_count(self.cycles,
                                                self.gExc_bin_size)
         if verbose:
             logger.info(f'\t▪ Level-crossings successfully calculated in '
                         f'{round((datetime.now() - t0).total_seconds(), 3)} '
                         f's.\n')
 
+        # exceedance at any level, to re-bin or aggregate flights
+        self.exceedance = Exceedance.from_cycles(self.cycles)
+
         # print(gc.get_count())
         # gc.collect()
         # print(gc.get_count())
 
     # ================ method to generate mean-range matrix ================
-    def mean_range_matrix(self, mean_bin_size, range_bin_size):
-        t0 = datetime.now()
-        if self.verbose:
-            m_r_matrix = matrices.mean_range_matrix(self.cycles, mean_bin_size,
-                                                    range_bin_size)
-            logger.info(f'\t▪ Mean-Range matrix successfully generated in '
-                        f'{round((datetime.now() - t0).total_seconds(), 3)} '
-                        f's.')
-        else:
-            m_r_matrix = matrices.mean_range_matrix(self.cycles, mean_bin_size,
-                                                    range_bin_size)
+    def mean_range(self, mean_bin_size=None, range_bin_size=None,
+                   sparse=False):
+        """
+        The mean-range matrix of the flight with its bin edges, memoized
+        per bin sizes.
+
+        :param mean_bin_size: Defaults to the one requested in the GUI.
+        :param range_bin_size: Defaults to the one requested in the GUI.
+        :param sparse: Store the counts in a `SparseMatrix`.
+        :return: MeanRangeMatrix
+        """
+        self._check_cycles()
+        key = (self.mean_bin_size if mean_bin_size is None
+               else mean_bin_size,
+               self.range_bin_size if range_bin_size is None
+               else range_bin_size, sparse)
+        m_r_matrix = self._mean_range.get(key)
+        if m_r_matrix is None:
+            # threads asking for the same bin sizes at once may each build
+            # it; the matrices are identical and any of them is kept
+            t0 = datetime.now()
+            m_r_matrix = matrices.MeanRangeMatrix.from_cycles(self.cycles,
+                                                              *key)
+            self._mean_range[key] = m_r_matrix
+            if self.verbose:
+                t = round((datetime.now() - t0).total_seconds(), 3)
+                logger.info(f'\t▪ Mean-Range matrix successfully generated '
+                            f'in {t} s.')
         return m_r_matrix
 
+    def mean_range_matrix(self, mean_bin_size, range_bin_size,
+                          sparse=False):
+        return self.mean_range(mean_bin_size, range_bin_size, sparse).counts
+
     # ================== method to generate from-to matrix ==================
-    def from_to_matrix(self, from_bin_size=0.25, to_bin_size=0.25):
+    def from_to_matrix(self, from_bin_size=0.25, to_bin_size=0.25,
+                       sparse=False):
+        self._check_cycles()
         t0 = datetime.now()
         if self.verbose:
             from_to_matrix = matrices.from_to(self.cycles, from_bin_size,
-                                              to_bin_size)
+                                              to_bin_size, sparse)
             logger.info(f'\t▪ From-To matrix successfully generated in '
                         f'{round((datetime.now() - t0).total_seconds(), 3)} '
                         f's.')
         else:
             from_to_matrix = matrices.from_to(self.cycles, from_bin_size,
-                                              to_bin_size)
+                                              to_bin_size, sparse)
         return from_to_matrix
 
+    def _check_cycles(self):
+        if self.cycles is None:
+            raise ValueError('cycles are not counted in g-exceedance only '
+                             'mode')
+
     # ========== method to calculate total damage from Minor's rule ==========
-    def total_damage(self, material, k_t):
+    def total_damage(self, material, k_t, mean_bin_size=None,
+                     range_bin_size=None, sparse=False):
+        """
+        Total damage of the flight, from its mean-range matrix.
+
+        :param material: Name of the material in the material library.
+        :param k_t: kₜ of the material.
+        :param mean_bin_size: Defaults to the one requested in the GUI.
+        :param range_bin_size: Defaults to the one requested in the GUI.
+        :param sparse: Sum the damage of the occupied cells only.
+        :return: float
+        """
+        m_r_matrix = self.mean_range(mean_bin_size, range_bin_size, sparse)
         t0 = datetime.now()
+        total_damage = matrices.damage(m_r_matrix, material, k_t)
         if self.verbose:
-            total_damage = matrices.damage(material, k_t)
             logger.info(f'\t▪ Total damage successfully calculated in '
                         f'{round((datetime.now() - t0).total_seconds(), 3)} '
                         f's.')
-        else:
-            total_damage = matrices.damage(material, k_t)
         return total_damage
 
 
+def _analyze_flight(file_path, *args, **kwargs):
+    """
+    Analyzes a flight in a worker process of ``MultipleFlights``. Only the
+    results needed for the aggregation (cycles, level-crossing bins and
+    counts) are sent back; the time and Nz arrays are dropped.
+    """
+    flight = RainFlowCounter(file_path, *args, **kwargs)
+    flight.tt = flight.nz = None
+    return flight
+
+
 class MultipleFlights:
 
-    def __init__(self, verbose=False):
+    def __init__(self, verbose=False, cache_dir=None, workers=1,
+                 catalog=False, selection=None, rules=None,
+                 exceedance_only=False, keep_flights=False,
+                 summary_dir=None, from_to_bin_size=0.25):
         """
         This is the main object that calls the GUI to either run a single
         IMU file or aggregate the IMU data from multiple flights and
@@ -143,7 +253,41 @@ class MultipleFlights:
 
         :param verbose: bool Determines whether punch report of the process
          time in the run console.
-
+        :param cache_dir: str Directory where the parsed IMU columns, and
+         in its ``stages`` subdirectory the reversals and cycles of each
+         flight (see ``stage_cache``), are cached between runs. Changing
+         only the bin sizes or the material then skips parsing, filtering
+         and cycle counting. No caching if ``None``.
+        :param workers: int Number of processes analyzing the flights in
+         parallel. Files which fail to be analyzed are reported and skipped.
+        :param catalog: bool In multi file analysis, select the files from
+         the SQLite catalog of the directory, which is updated first,
+         instead of opening every file. The catalog is kept locally, in the
+         ``catalogs`` subdirectory of ``cache_dir`` if given.
+        :param selection: dict Keyword arguments of ``FlightCatalog.select``,
+         e.g. ``dict(start='2021-10-01', end='2021-11-01')``.
+        :param rules: ValidationRules Rules checked while each file is
+         read; a file breaking one of them is discarded as soon as it is
+         detected. Defaults to rejecting Nz higher than 3.5g.
+        :param exceedance_only: bool Compute the g-exceedance curve straight
+         from the reversals of each flight, without counting its cycles.
+         The flights then have no mean-range nor from-to matrix.
+        :param keep_flights: bool Keep the `RainFlowCounter` object of each
+         flight in ``self.flights``. Otherwise only the fleet aggregates are
+         kept: the level crossings in ``self.accumulator``, the exceedance
+         in ``self.exceedance``, whose size is bound by the number of
+         distinct Nz values rather than the number of flights, and the
+         matrices in ``self.mean_range`` and ``self.from_to``.
+        :param summary_dir: str Directory of a ``SummaryStore`` where the
+         summary of each analyzed flight is written, to build the curves
+         and matrices of any subset of the flights later on without
+         analyzing them again. No summaries if ``None``.
+        :param from_to_bin_size: float Bin size of the peaks and valleys of
+         the fleet from-to matrix.
+
+        The outcome for each selected file is recorded in ``self.report``:
+        the analyzed files, and the rejected and failed ones with the
+        reason.
         """
         t0 = datetime.now()
         self.verbose = verbose
@@ -152,6 +296,7 @@ class MultipleFlights:
         self.mode, mean_bin_size, range_bin_size, gExc_bin_size, \
         self.address, material, k_t, rt_flt, h, self.show_labels = \
             GUI.call_gui()
+        self.material, self.k_t = material, k_t
 
         # adjust file names and addresses depending on analysis type requested
         if self.mode:  # if multi file analysis is requested
@@ -163,79 +308,179 @@ class MultipleFlights:
             # get the directory name
             self.address = os.path.dirname(self.address)
 
-        # create and populate a list, each element of which is a
-        # `RainFlowCounter` object generated by processing each file (flight)
-        self.flights = []
-        i = 0
-        for file_name in imu_files:
-            i += 1
-            # use only *.dat files
-            ext = os.path.splitext(file_name)[1]
-            if ext != '.dat':
-                pass
-            else:
-                with open(os.path.join(self.address, file_name), 'r') as f:
-                    if len(f.readline()) != 152:
-                        pass
-                    else:
-                        logger.info(
-                            f'• {i}. Analyzing "{file_name.split(".")[0]}"')
-                        flight = RainFlowCounter(
-                            os.path.join(self.address, file_name),
-                            mean_bin_size, range_bin_size,
-                            material, k_t, gExc_bin_size,
-                            racetrack_filter=rt_flt, h=h,
-                            verbose=self.verbose)
-
-                        # in case flight data contains Nz > 3, discard file
-                        if flight.invalid_data:
-                            logger.warning(
-                                f'File "{file_name.split(".")[0]}" contains '
-                                f'Nz values higher than 3.5g, therefore was '
-                                f'discarded.')
-                            continue
+        # select the IMU files; the first line of a valid file is 152 chars
+        selected = []
+        if self.mode and catalog:  # query the catalog of the directory
+            db_path = None if cache_dir is None else catalog_path(
+                self.address, os.path.join(cache_dir, 'catalogs'))
+            with FlightCatalog(self.address, db_path) as flight_catalog:
+                updated = flight_catalog.scan()
+                logger.info(f'{updated} new or changed file(s) cataloged in '
+                            f'"{flight_catalog.db_path}".')
+                selected = list(enumerate(
+                    flight_catalog.select(**(selection or {})), 1))
+        else:
+            i = 0
+            for file_name in imu_files:
+                i += 1
+                # use only *.dat files, compressed or not
+                if not get_data_np.is_imu_file(file_name):
+                    pass
+                else:
+                    with get_data_np.open_imu(
+                            os.path.join(self.address, file_name), 'rt') as f:
+                        if len(f.readline()) != 152:
+                            pass
                         else:
-                            self.flights.append(flight)
-
-        # each flight object has its own dimensions based on its data range
-        # and requested g-exceedance resolution. Below all flights are
-        # padded with zeros to match the flight with the widest data range.
-
-        # farthest bin above baseline (flight with the widest data range)
-        highest_bin = max([len(f.top_counts) for f in self.flights])
-        self.x_above = np.argmax([len(f.top_counts) for f in self.flights])
-
-        # farthest bin below baseline (flight with the widest data range)
-        lowest_bin = max([len(f.bottom_counts) for f in self.flights])
-        self.x_below = np.argmax([len(f.bottom_counts) for f in self.flights])
-
-        for f in self.flights:
-            if len(f.top_counts) < highest_bin:
-                f.top_counts = np.pad(f.top_counts,
-                                      (0, highest_bin - len(f.top_bins)),
-                                      'constant')
-
-            if len(f.bottom_counts) < lowest_bin:
-                f.bottom_counts = np.pad(f.bottom_counts,
-                                         (0, lowest_bin - len(f.bottom_bins)),
-                                         'constant')
+                            selected.append((i, file_name))
+
+        # process each file (flight) into a `RainFlowCounter` object,
+        # in parallel if requested
+        args = (mean_bin_size, range_bin_size, material, k_t, gExc_bin_size)
+        rules = ValidationRules() if rules is None else rules
+        kwargs = dict(racetrack_filter=rt_flt, h=h, verbose=self.verbose,
+                      cache_dir=cache_dir, rules=rules,
+                      exceedance_only=exceedance_only,
+                      hash_file=summary_dir is not None)
+        self.report = {'analyzed': [], 'rejected': {}, 'failed': {}}
+
+        # the level crossings of the fleet are accumulated on a fixed grid
+        # of levels around the baseline, spanning the Nz accepted by the
+        # validation rules: each flight adds its crossings as soon as it is
+        # analyzed and is then discarded, unless `keep_flights`
+        grid = dict(
+            max_g=GRID_MAX_G if rules.max_nz is None else rules.max_nz,
+            min_g=GRID_MIN_G if rules.min_nz is None else rules.min_nz)
+        self.accumulator = ExceedanceAccumulator(gExc_bin_size, **grid)
+
+        # and so are the mean-range and from-to matrices, on the same span
+        self.mean_range = self.from_to = None
+        if not exceedance_only:
+            self.mean_range = matrices.MeanRangeAccumulator(
+                mean_bin_size, range_bin_size, **grid)
+            self.from_to = matrices.FromToAccumulator(
+                from_to_bin_size, from_to_bin_size, **grid)
+        self.exceedance = None
+        self._exceedances = []  # merged into `self.exceedance` in batches
+        kept = {}
+        store = SummaryStore(summary_dir) if summary_dir is not None \
+            else None
+
+        def add(i, flight):
+            if store is not None:
+                store.add(summary_store.summarize_flight(flight))
+            self.accumulator.add_exceedance(flight.exceedance)
+            if self.mean_range is not None:
+                self.mean_range.add(flight.cycles)
+                self.from_to.add(flight.cycles)
+            self._exceedances.append(flight.exceedance)
+            if len(self._exceedances) >= _MERGE_BATCH:
+                self._merge_exceedances()
+            kept[i] = flight if keep_flights else None
+
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {}
+                for i, file_name in selected:
+                    logger.info(
+                        f'• {i}. Analyzing "{file_name.split(".")[0]}"')
+                    futures[executor.submit(
+                        _analyze_flight, os.path.join(self.address, file_name),
+                        *args, **kwargs)] = (i, file_name)
+
+                for future in as_completed(futures):
+                    i, file_name = futures.pop(future)
+                    try:
+                        add(i, future.result())
+                    except FlightRejected as err:
+                        self._reject(file_name, err)
+                    except Exception as err:
+                        self._fail(file_name, err)
+        else:
+            for i, file_name in selected:
+                logger.info(f'• {i}. Analyzing "{file_name.split(".")[0]}"')
+                try:
+                    add(i, RainFlowCounter(
+                        os.path.join(self.address, file_name), *args,
+                        **kwargs))
+                except FlightRejected as err:
+                    self._reject(file_name, err)
+                except Exception as err:
+                    self._fail(file_name, err)
+        self._merge_exceedances()
+        if store is not None:
+            store.flush()
+
+        # the analyzed files and, if kept, the flights in the order of the
+        # files regardless of the order in which they were completed
+        self.flights = []
+        for i, file_name in selected:
+            if i in kept:  # not rejected nor failed
+                self.report['analyzed'].append(file_name)
+                if keep_flights:
+                    self.flights.append(kept[i])
 
         # aggregation of all flights (files)
-        self.above_baseline_counts = \
-            sum([f.top_counts for f in self.flights])
-        self.below_baseline_counts = \
-            sum([f.bottom_counts for f in self.flights])
+        self.top_bins, self.bottom_bins, self.above_baseline_counts, \
+            self.below_baseline_counts = self.accumulator.level_crossings()
+        if self.accumulator.beyond:
+            logger.warning(
+                f'{self.accumulator.beyond:g} peaks and valleys are beyond '
+                f'the g-exceedance levels, from {self.accumulator.min_g} to '
+                f'{self.accumulator.max_g} g: the levels beyond are not '
+                f'counted.')
+        if self.mean_range is not None and \
+                self.mean_range.beyond + self.from_to.beyond:
+            logger.warning(
+                f'{self.mean_range.beyond:g} cycles beyond the mean-range '
+                f'grid and {self.from_to.beyond:g} beyond the from-to grid '
+                f'are not counted in the fleet matrices.')
 
         minutes = divmod((datetime.now() - t0).total_seconds(), 60)
         logger.info(
             f'Total collapsed time is '
             f'{int(minutes[0])} minutes and {round(minutes[1], 3)} seconds.')
 
+    def total_damage(self, material=None, k_t=None):
+        """
+        Total damage of the fleet, from its mean-range matrix.
+
+        :param material: Name of the material in the material library.
+         Defaults to the one requested in the GUI.
+        :param k_t: kₜ of the material. Defaults to the one requested in
+         the GUI.
+        :return: float
+        """
+        if self.mean_range is None:
+            raise ValueError('cycles are not counted in g-exceedance only '
+                             'mode')
+        return self.mean_range.damage(
+            self.material if material is None else material,
+            self.k_t if k_t is None else k_t)
+
+    def _merge_exceedances(self):
+        if self._exceedances:
+            if self.exceedance is not None:
+                self._exceedances.append(self.exceedance)
+            self.exceedance = Exceedance.merge(self._exceedances)
+            self._exceedances = []
+
+    def _reject(self, file_name, err):
+        logger.warning(f'File "{file_name.split(".")[0]}" was discarded: '
+                       f'{err.reason}.')
+        self.report['rejected'][file_name] = f'{err.rule}: {err.reason}'
+
+    def _fail(self, file_name, err):
+        logger.error(f'File "{file_name.split(".")[0]}" could not be '
+                     f'analyzed: {err!r}')
+        self.report['failed'][file_name] = repr(err)
+
     def g_exc_curve(self,
                     title: str = 'g-Exceedance Spectra',
                     x_label: str = r'$N_Z$, Vertical Acceleration [g]',
                     y_label: str = 'Cumulative Exceedance Count',
-                    save_figure: bool = False):
+                    save_figure: bool = False,
+                    level_width: float = None):
         """
         Method to generate the aggregate g-exceedance curve from all input data
 
@@ -243,17 +488,27 @@ class MultipleFlights:
         :param x_label: x-axis label
         :param y_label: y-axis label
         :param save_figure: should the graph be saved?
+        :param level_width: g-exceedance resolution of the graph. Defaults to
+         the one requested in the GUI.
         :return: Shows the graph.
         """
 
+        if level_width is None:
+            top_bins = self.top_bins
+            bottom_bins = self.bottom_bins
+            top_counts = self.above_baseline_counts
+            bottom_counts = self.below_baseline_counts
+        else:  # re-bin the aggregate exceedance, no need to count again
+            top_bins, bottom_bins, top_counts, bottom_counts = \
+                self.exceedance.level_crossings(level_width)
+
         fig, ax = plt.subplots(figsize=(11, 7), dpi=150)
         plt.subplots_adjust(bottom=0.1, top=0.94, right=0.96, left=0.1)
 
-        graphs.g_exceedance_plot(top_bins=self.flights[self.x_above].top_bins,
-                                 top_counts=self.above_baseline_counts,
-                                 bottom_bins=self.flights[
-                                     self.x_below].bottom_bins,
-                                 bottom_counts=self.below_baseline_counts,
+        graphs.g_exceedance_plot(top_bins=top_bins,
+                                 top_counts=top_counts,
+                                 bottom_bins=bottom_bins,
+                                 bottom_counts=bottom_counts,
                                  title=title, x_label=x_label, y_label=y_label,
                                  print_label=self.show_labels,
                                  print_bins=False,
@@ -0,0 +1,173 @@
+"""
+Disk cache of the results of the analysis stages which do not depend on the
+bin sizes or the material: the filtered reversals and the cycle table of a
+flight.
+
+Entries are content addressed. The key of an entry is made of the hash of
+the IMU file content, the stage name, the stage parameters (e.g. ``h`` and
+whether the racetrack filter is on) and the version of the code of the
+stage: a digest of the modules implementing it and of the version of the
+entry layout, which ``rf_counter`` writes and reads. Changing any of them,
+including editing these modules, misses the cache, while renaming, copying
+or touching an IMU file does not. The directory is kept under a size cap
+by evicting the least recently used entries.
+
+The entries are kept in the ``STAGES_DIR`` subdirectory of the
+``cache_dir`` given to ``RainFlowCounter`` or ``MultipleFlights``, next to
+the entries of ``data_cache``. Run from the repository root to remove
+entries, with that ``cache_dir`` or its subdirectory:
+
+    python -m utils.stage_cache CACHE_DIR [--file IMU_FILE] [--stage STAGE]
+"""
+import argparse
+import hashlib
+import json
+import os
+
+import numpy as np
+
+from utils import cycle_table, data_cache, get_data_np, racetrack, \
+    rainflow_kernel, validation
+
+# default size cap of the cache directory in bytes
+MAX_CACHE_SIZE = 1024 ** 3
+
+# subdirectory of the stage entries in the cache directory of `rf_counter`
+STAGES_DIR = 'stages'
+
+# modules whose code determines the result of each stage
+STAGE_MODULES = {
+    'reversals': (get_data_np, validation, racetrack),
+    'cycles': (rainflow_kernel, cycle_table),
+}
+
+# version of the arrays stored for each stage by `rf_counter`, to be bumped
+# whenever they change
+STAGE_VERSIONS = {
+    'reversals': 2,
+    'cycles': 1,
+}
+
+# hash of the whole content of an IMU file, shared with the data cache
+content_hash = data_cache.content_hash
+
+_code_versions = {}
+
+
+def code_version(stage: str) -> str:
+    """
+    Digest of the source of the modules implementing ``stage``, and the
+    stages before it, and of the versions of their entries.
+
+    :param stage: stage name, a key of ``STAGE_MODULES``
+    :return: hexadecimal digest
+    """
+    if stage not in _code_versions:
+        digest = hashlib.blake2b(digest_size=8)
+        for name, modules in STAGE_MODULES.items():
+            for module in modules:
+                with open(module.__file__, 'rb') as f:
+                    digest.update(f.read())
+            digest.update(f'{name} {STAGE_VERSIONS[name]}'.encode())
+            if name == stage:
+                break
+        else:
+            raise KeyError(f'unknown stage "{stage}"')
+        _code_versions[stage] = digest.hexdigest()
+    return _code_versions[stage]
+
+
+def load(cache_dir: str, file_hash: str, stage: str, params: dict):
+    """
+    Looks up the result of a stage.
+
+    :param cache_dir: cache directory
+    :param file_hash: ``content_hash`` of the IMU file
+    :param stage: stage name
+    :param params: parameters of the stage and the stages before it
+    :return: dict of arrays, or ``None`` if the stage is not cached
+    """
+    entry = _entry_path(cache_dir, file_hash, stage, params)
+    if not os.path.isfile(entry):
+        return None
+
+    try:
+        with np.load(entry) as npz:
+            arrays = {k: npz[k] for k in npz.files}
+    except (OSError, ValueError):  # unreadable or partial entry
+        return None
+
+    os.utime(entry)  # mark as recently used
+    return arrays
+
+
+def store(cache_dir: str, file_hash: str, stage: str, params: dict,
+          arrays: dict, max_size: int = MAX_CACHE_SIZE):
+    """
+    Stores the result of a stage, then evicts the least recently used
+    entries over ``max_size``.
+
+    :param cache_dir: cache directory, created if missing
+    :param file_hash: ``content_hash`` of the IMU file
+    :param stage: stage name
+    :param params: parameters of the stage and the stages before it
+    :param arrays: dict of arrays, the result of the stage
+    :param max_size: size cap of the cache directory in bytes
+    :return: None
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    data_cache.write_npz(_entry_path(cache_dir, file_hash, stage, params),
+                         arrays)
+    data_cache.evict(cache_dir, max_size)
+
+
+def invalidate(cache_dir: str, file_path: str = None,
+               stage: str = None) -> int:
+    """
+    Removes the entries of an IMU file, of a stage, of both or, if neither
+    is given, all the entries.
+
+    :param cache_dir: cache directory, or the cache directory of
+     ``rf_counter`` holding it in ``STAGES_DIR``
+    :param file_path: path to the IMU file
+    :param stage: stage name
+    :return: the number of entries removed
+    """
+    if os.path.isdir(os.path.join(cache_dir, STAGES_DIR)):
+        cache_dir = os.path.join(cache_dir, STAGES_DIR)
+    prefix = content_hash(file_path) if file_path is not None else None
+
+    removed = 0
+    for e in data_cache.entries(cache_dir):
+        name = e.name.split('.')
+        if len(name) != 4:  # not a `<hash>.<stage>.<key>.npz` entry
+            continue
+        file_hash, entry_stage = name[:2]
+        if prefix not in (None, file_hash) or stage not in (None,
+                                                             entry_stage):
+            continue
+        os.remove(e.path)
+        removed += 1
+    return removed
+
+
+def _entry_path(cache_dir: str, file_hash: str, stage: str,
+                params: dict) -> str:
+    key = json.dumps([params, code_version(stage)], sort_keys=True)
+    key = hashlib.blake2b(key.encode(), digest_size=16).hexdigest()
+    return os.path.join(cache_dir, f'{file_hash}.{stage}.{key}.npz')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Invalidate entries of the stage cache.')
+    parser.add_argument('cache_dir',
+                        help='cache directory of the analysis, or its '
+                             f'"{STAGES_DIR}" subdirectory')
+    parser.add_argument('--file', help='remove the entries of this IMU file')
+    parser.add_argument('--stage', choices=list(STAGE_MODULES),
+                        help='remove the entries of this stage')
+    args = parser.parse_args()
+
+    n = invalidate(args.cache_dir, args.file, args.stage)
+    print(f'{n} entries removed from "{args.cache_dir}".')
@@ -0,0 +1,493 @@
+"""
+Local columnar store of per-flight summaries.
+
+Each analyzed flight is summarized in one record: the histograms of its
+peaks and valleys, for the level crossings, and of its mean-range and
+from-to cycles on a fine grid of ``FINE_BIN`` g, its duration, its Nz
+extremes and the analysis parameters. The size of the level crossing
+histogram only depends on the grid, not on the length of the flight. Fleet
+g-exceedance curves and matrices of any subset of the flights are then
+built from the records, without reading nor counting the IMU files again.
+
+The store is a directory of ``.npz`` segments, one per ``flush``. A segment
+holds one array per column, the histograms of all its flights concatenated
+with the offsets of each flight. The records of a file analyzed again with
+the same parameters replace the older ones.
+"""
+import json
+import os
+import time
+
+import numpy as np
+
+from utils import data_cache, level_crossing
+from utils.exceedance import Exceedance
+from utils.matrices import SparseMatrix
+
+# width in g of the fine bins of the histograms; the level widths and bin
+# sizes of the queries must be multiples of it, e.g. 0.002 g
+FINE_BIN = .001
+_FINE_PER_G = 1000
+
+# one value per flight
+_SCALARS = ('file_name', 'digest', 'params', 'first_time', 'duration',
+            'nz_min', 'nz_max', 'cycles', 'mean_min', 'mean_max',
+            'range_min', 'range_max', 'peak_min', 'peak_max', 'valley_min',
+            'valley_max', 'exc_min', 'exc_max')
+
+# variable length columns of each flight, e.g. ``mr_counts``, with their
+# offsets, e.g. ``mr_offsets``
+_RAGGED = {
+    'exc': ('bins', 'counts'),  # peaks and valleys, see `_level_bins`
+    'mr': ('range', 'mean', 'counts'),  # rows and columns of the matrix
+    'ft': ('to', 'from', 'counts'),
+}
+
+
+def summarize(file_name: str, digest: str, params: dict,
+              exceedance: Exceedance, cycles=None, first_time=None,
+              duration: float = np.nan, nz_min: float = np.nan,
+              nz_max: float = np.nan) -> dict:
+    """
+    Builds the summary record of a flight.
+
+    :param file_name: name of the IMU file
+    :param digest: ``stage_cache.content_hash`` of the IMU file
+    :param params: analysis parameters, e.g. the validation rules and the
+     racetrack filter width
+    :param exceedance: Exceedance of the flight
+    :param cycles: CycleTable of the flight, or ``None`` if its cycles are
+     not counted: it then has no matrices
+    :param first_time: timestamp of the first record
+    :param duration: duration of the flight in seconds
+    :param nz_min: lowest Nz of the flight
+    :param nz_max: highest Nz of the flight
+    :return: dict of the record columns
+    """
+    record = dict(
+        file_name=file_name, digest=digest,
+        params=json.dumps(params, sort_keys=True),
+        first_time=np.datetime64('NaT' if first_time is None else first_time,
+                                 'us'),
+        duration=duration, nz_min=nz_min, nz_max=nz_max,
+        cycles=cycles is not None and len(cycles) > 0)
+
+    if exceedance.base_g != 1.:
+        raise ValueError('exceedance with a baseline other than 1 g')
+    # exact extremes, which lay out the levels, and the peaks and valleys
+    # on the levels of the fine grid or between them
+    values = exceedance.values
+    record['exc_min'] = values[0] if len(values) else np.nan
+    record['exc_max'] = values[-1] if len(values) else np.nan
+    bins, inverse = np.unique(_level_bins(values), return_inverse=True)
+    record['exc_bins'] = bins
+    record['exc_counts'] = np.bincount(inverse.reshape(-1), exceedance.counts,
+                                       minlength=len(bins))
+
+    columns = dict(mean=None, range=None, peak=None, valley=None)
+    if record['cycles']:
+        columns = dict(mean=cycles.mean.astype('float64'),
+                       range=cycles.range.astype('float64'),
+                       peak=cycles.peak, valley=cycles.valley)
+    for name, values in columns.items():
+        record[f'{name}_min'] = np.nan if values is None else values.min()
+        record[f'{name}_max'] = np.nan if values is None else values.max()
+
+    # sparse fine histograms: the distinct (row, column) bins and counts
+    for group, row, col in (('mr', 'range', 'mean'),
+                            ('ft', 'valley', 'peak')):
+        keys = [f'{group}_{key}' for key in _RAGGED[group]]
+        if not record['cycles']:
+            record.update(zip(keys, (np.empty(0, dtype='int32'),
+                                     np.empty(0, dtype='int32'),
+                                     np.empty(0))))
+            continue
+        bins = np.stack([_fine_bins(columns[row]), _fine_bins(columns[col])])
+        bins, inverse = np.unique(bins, axis=1, return_inverse=True)
+        record.update(zip(keys, (bins[0], bins[1], np.bincount(
+            inverse.reshape(-1), cycles.count, minlength=bins.shape[1]))))
+
+    return record
+
+
+def summarize_flight(flight) -> dict:
+    """
+    Builds the summary record of a flight analyzed by ``RainFlowCounter``,
+    without reading its IMU file again.
+
+    :param flight: RainFlowCounter, analyzed with ``cache_dir`` or
+     ``hash_file`` so that it carries the hash of the file
+    :return: dict of the record columns
+    """
+    if flight.file_hash is None:
+        raise ValueError('flight analyzed without the hash of its file, '
+                         'see `hash_file`')
+    return summarize(os.path.basename(flight.file_path), flight.file_hash,
+                     flight.params, flight.exceedance, flight.cycles,
+                     flight.first_time, flight.duration, flight.nz_min,
+                     flight.nz_max)
+
+
+class SummaryStore:
+    def __init__(self, directory: str):
+        """
+        Opens, or creates, the summary store in ``directory`` and loads its
+        records.
+
+        :param directory: str Directory of the store segments.
+        """
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._pending = []  # records added since the last flush
+        self.columns = _concatenate([_load(path) for path in self._segments()])
+
+    def __len__(self):
+        return len(self.columns['file_name'])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.flush()
+
+    def add(self, record: dict):
+        """
+        Adds the record of a flight, written at the next ``flush``.
+
+        :param record: dict, as built by ``summarize``
+        :return: None
+        """
+        self._pending.append(record)
+
+    def flush(self):
+        """
+        Writes the records added since the last flush into a new segment.
+
+        :return: None
+        """
+        if not self._pending:
+            return
+        columns = _concatenate([_columns(self._pending)])
+        self._pending = []
+        _save(self.directory, columns)
+        self.columns = _concatenate([self.columns, columns])
+
+    def compact(self):
+        """
+        Rewrites the store into a single segment, without the replaced
+        records.
+
+        :return: None
+        """
+        self.flush()
+        old = self._segments()
+        _save(self.directory, self.columns)
+        for path in old:
+            os.remove(path)
+
+    def select(self, file_names=None, start=None, end=None,
+               min_duration=None, max_duration=None, max_nz=None,
+               min_nz=None, params=None) -> np.ndarray:
+        """
+        Queries the store for flights.
+
+        :param file_names: Names of the IMU files, e.g. selected from the
+         ``FlightCatalog``.
+        :param start: Earliest first timestamp, e.g. ``'2021-10-01'``.
+        :param end: Latest first timestamp, exclusive.
+        :param min_duration: float Shortest duration in seconds.
+        :param max_duration: float Longest duration in seconds.
+        :param max_nz: float Highest Nz in g the flights do not exceed.
+        :param min_nz: float Lowest Nz in g the flights do not exceed.
+        :param params: dict Analysis parameters of the summaries.
+        :return: the indices of the matching records, in chronological
+         order.
+        """
+        c = self.columns
+        selected = np.ones(len(self), dtype=bool)
+        if file_names is not None:
+            selected &= np.isin(c['file_name'], list(file_names))
+        if start is not None:
+            selected &= c['first_time'] >= np.datetime64(start, 'us')
+        if end is not None:
+            selected &= c['first_time'] < np.datetime64(end, 'us')
+        if min_duration is not None:
+            selected &= c['duration'] >= min_duration
+        if max_duration is not None:
+            selected &= c['duration'] <= max_duration
+        if max_nz is not None:
+            selected &= c['nz_max'] <= max_nz
+        if min_nz is not None:
+            selected &= c['nz_min'] >= min_nz
+        if params is not None:
+            selected &= c['params'] == json.dumps(params, sort_keys=True)
+
+        rows = np.flatnonzero(selected)
+        order = np.lexsort((c['file_name'][rows], c['first_time'][rows]))
+        return rows[order]
+
+    def exceedance(self, rows=None) -> Exceedance:
+        """
+        Merges the exceedances of the selected flights. Their peaks and
+        valleys on a level of the fine grid stay there and the others are
+        moved to the middle of their fine bin, which leaves the exceedances
+        of the levels of the grid unchanged.
+
+        :param rows: indices of the records, as returned by ``select``. All
+         the records if ``None``.
+        :return: Exceedance
+        """
+        bins, counts = self._ragged('exc', self._rows(rows))
+        if not len(bins):
+            return Exceedance(np.empty(0), np.empty(0))
+        lowest = bins.min()
+        counts = np.bincount(bins - lowest, counts)
+        present = np.flatnonzero(counts)
+        return Exceedance((present + lowest) / (2 * _FINE_PER_G),
+                          counts[present])
+
+    def level_crossings(self, level_width: float, rows=None) -> (
+            list, list, np.ndarray, np.ndarray):
+        """
+        Counts the level crossings of the selected flights, identical to
+        ``level_crossing.level_cross_count`` of all their cycles. With level
+        widths inexact in binary, e.g. 0.1, peaks and valleys on a level
+        may differ: the levels of ``level_cross_count`` are rounded.
+
+        :param level_width: Width of the desired levels, a multiple of
+         ``FINE_BIN``
+        :param rows: indices of the records. All the records if ``None``.
+        :return: two lists containing the bins above and below baseline,
+         and two arrays containing the counts of each bin above and below
+         baseline.
+        """
+        _fine_multiple(level_width)
+        rows = self._rows(rows)
+        exceedance = self.exceedance(rows)
+        if not len(exceedance.values):
+            return [], [], np.zeros(0), np.zeros(0)
+
+        # same levels as `level_cross_count`, from the exact extremes
+        top_bins, bottom_bins, top, bottom = level_crossing.level_bins(
+            self.columns['exc_max'][rows].max(),
+            self.columns['exc_min'][rows].min(), level_width)
+        return top_bins, bottom_bins, \
+            exceedance.above(1. + np.arange(top) * level_width), \
+            exceedance.below(-(-1. + np.arange(bottom) * level_width))
+
+    def mean_range_matrix(self, mean_bin_size: float, range_bin_size: float,
+                          rows=None, sparse: bool = False):
+        """
+        Builds the mean-range matrix of the selected flights, identical to
+        ``matrices.mean_range_matrix`` of all their cycles. With bin sizes
+        inexact in binary, e.g. 0.1, cycles on a bin edge may differ: the
+        edges of ``matrices`` are rounded.
+
+        :param mean_bin_size: multiple of ``FINE_BIN``
+        :param range_bin_size: multiple of ``FINE_BIN``
+        :param rows: indices of the records. All the records if ``None``.
+        :param sparse: return a ``matrices.SparseMatrix``
+        :return: the mean-range matrix
+        """
+        return self._matrix('mr', ('range', 'mean'),
+                            (range_bin_size, mean_bin_size), rows, sparse)
+
+    def from_to_matrix(self, from_bin_size: float = .25,
+                       to_bin_size: float = .25, rows=None,
+                       sparse: bool = False):
+        """
+        Builds the from-to matrix of the selected flights, identical to
+        ``matrices.from_to`` of all their cycles. With bin sizes inexact in
+        binary, e.g. 0.1, cycles on a bin edge may differ: the edges of
+        ``matrices`` are rounded.
+
+        :param from_bin_size: multiple of ``FINE_BIN``
+        :param to_bin_size: multiple of ``FINE_BIN``
+        :param rows: indices of the records. All the records if ``None``.
+        :param sparse: return a ``matrices.SparseMatrix``
+        :return: the from-to matrix
+        """
+        return self._matrix('ft', ('valley', 'peak'),
+                            (to_bin_size, from_bin_size), rows, sparse)
+
+    def _segments(self) -> list:
+        return sorted(e.path for e in data_cache.entries(self.directory))
+
+    def _rows(self, rows) -> np.ndarray:
+        """
+        Checks that the selected records share their analysis parameters.
+        """
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows)
+        if not len(rows):
+            raise ValueError('no flight selected')
+        if len(np.unique(self.columns['params'][rows])) > 1:
+            raise ValueError('flights analyzed with different parameters, '
+                             'select them with `params`')
+        return rows
+
+    def _ragged(self, group: str, rows: np.ndarray) -> list:
+        """
+        Concatenates the variable length columns of the selected records.
+        """
+        positions = _positions(self.columns[f'{group}_offsets'], rows)
+        return [self.columns[f'{group}_{key}'][positions]
+                for key in _RAGGED[group]]
+
+    def _matrix(self, group, names, bin_sizes, rows, sparse):
+        rows = self._rows(rows)
+        if not self.columns['cycles'][rows].all():
+            raise ValueError('flights without cycles selected, analyzed in '
+                             'g-exceedance only mode')
+        bins = self._ragged(group, rows)
+        counts = bins.pop()
+
+        shape, indices = [], []
+        for name, fine, bin_size in zip(names, bins, bin_sizes):
+            n = _fine_multiple(bin_size)
+            # same edges as `matrices`, from the extremes of the cycles
+            lowest = np.floor(self.columns[f'{name}_min'][rows].min())
+            highest = np.ceil(self.columns[f'{name}_max'][rows].max())
+            edges = np.arange(lowest, highest + bin_size, bin_size)
+            shape.append(len(edges) - 1)
+            # the fine bins are in the bins of the edges, `right=True`
+            indices.append((fine - int(lowest) * _FINE_PER_G) // n)
+
+        # a value on the lowest edge is in the bin -1, i.e. the last one,
+        # like in `matrices`
+        if sparse:
+            return SparseMatrix.from_indices(
+                *(i % n for i, n in zip(indices, shape)), counts, shape)
+        flat = np.ravel_multi_index(indices, shape, mode='wrap')
+        return np.bincount(flat, counts, minlength=shape[0] * shape[1]) \
+            .reshape(shape)
+
+
+def _fine_bins(values: np.ndarray) -> np.ndarray:
+    """
+    Index of the fine bin of each value; the fine bin ``i`` spans
+    ``(i * FINE_BIN, (i + 1) * FINE_BIN]``, up to values within 1e-12 g of
+    its edges which lie on them.
+    """
+    return (np.ceil(np.round(values * _FINE_PER_G, 9)) - 1).astype('int32')
+
+
+def _fine_multiple(width: float) -> int:
+    """
+    Number of fine bins in ``width``.
+    """
+    n = int(round(width * _FINE_PER_G))
+    if n < 1 or abs(n * FINE_BIN - width) > 1e-9:
+        raise ValueError(f'{width} g is not a multiple of {FINE_BIN} g')
+    return n
+
+
+def _level_bins(values: np.ndarray) -> np.ndarray:
+    """
+    Index of each value on the fine grid halved: ``2 * i`` on the level
+    ``i * FINE_BIN``, ``2 * i + 1`` between it and the next level, up to
+    values within 1e-12 g of the levels which lie on them.
+    """
+    x = np.round(values * _FINE_PER_G, 9)
+    lower = np.floor(x)
+    return (2 * lower + (x > lower)).astype('int32')
+
+
+def _positions(offsets: np.ndarray, rows: np.ndarray) -> np.ndarray:
+    """
+    Positions of the variable length values of the records ``rows``.
+    """
+    starts, lengths = offsets[rows], offsets[rows + 1] - offsets[rows]
+    return np.repeat(starts - np.r_[0, np.cumsum(lengths)[:-1]],
+                     lengths) + np.arange(lengths.sum())
+
+
+def _columns(records: list) -> dict:
+    """
+    Stacks records into the columns of a segment.
+    """
+    columns = {name: np.array([r[name] for r in records])
+               for name in _SCALARS}
+    columns['first_time'] = columns['first_time'].astype('datetime64[us]')
+    for group, keys in _RAGGED.items():
+        lengths = [len(r[f'{group}_counts']) for r in records]
+        columns[f'{group}_offsets'] = np.r_[0, np.cumsum(lengths)].astype(
+            'int64')
+        for key in keys:
+            columns[f'{group}_{key}'] = np.concatenate(
+                [r[f'{group}_{key}'] for r in records])
+    return columns
+
+
+def _concatenate(segments: list) -> dict:
+    """
+    Concatenates segments, keeping only the latest record of each IMU file
+    content and analysis parameters.
+    """
+    segments = [s for s in segments if s is not None and len(s['file_name'])]
+    if not segments:
+        return _empty()
+
+    columns = {}
+    for name in _SCALARS:
+        columns[name] = np.concatenate([s[name] for s in segments])
+    for group, keys in _RAGGED.items():
+        shifts = np.cumsum([0] + [s[f'{group}_offsets'][-1]
+                                  for s in segments[:-1]])
+        columns[f'{group}_offsets'] = np.r_[0, np.concatenate(
+            [s[f'{group}_offsets'][1:] + shift
+             for s, shift in zip(segments, shifts)])]
+        for key in keys:
+            columns[f'{group}_{key}'] = np.concatenate(
+                [s[f'{group}_{key}'] for s in segments])
+
+    # latest record of each (digest, params)
+    keys = np.char.add(np.char.add(columns['digest'], ' '),
+                       columns['params'])
+    _, last = np.unique(keys[::-1], return_index=True)
+    keep = np.sort(len(keys) - 1 - last)
+    if len(keep) == len(keys):
+        return columns
+    return _take(columns, keep)
+
+
+def _take(columns: dict, rows: np.ndarray) -> dict:
+    taken = {name: columns[name][rows] for name in _SCALARS}
+    for group, keys in _RAGGED.items():
+        offsets = columns[f'{group}_offsets']
+        lengths = offsets[rows + 1] - offsets[rows]
+        taken[f'{group}_offsets'] = np.r_[0, np.cumsum(lengths)]
+        positions = _positions(offsets, rows)
+        for key in keys:
+            taken[f'{group}_{key}'] = columns[f'{group}_{key}'][positions]
+    return taken
+
+
+def _empty() -> dict:
+    columns = {name: np.empty(0) for name in _SCALARS}
+    for name in ('file_name', 'digest', 'params'):
+        columns[name] = np.empty(0, dtype='U1')
+    columns['first_time'] = np.empty(0, dtype='datetime64[us]')
+    columns['cycles'] = np.empty(0, dtype=bool)
+    for group, keys in _RAGGED.items():
+        columns[f'{group}_offsets'] = np.zeros(1, dtype='int64')
+        for key in keys:
+            columns[f'{group}_{key}'] = np.empty(
+                0, dtype='float64' if key == 'counts' else 'int32')
+    return columns
+
+
+def _load(path: str):
+    try:
+        with np.load(path) as npz:
+            columns = {k: npz[k] for k in npz.files}
+    except (OSError, ValueError):  # unreadable or partial segment
+        return None
+    if set(columns) != set(_empty()):  # segment of an older layout
+        return None
+    return columns
+
+
+def _save(directory: str, columns: dict):
+    # segment names sort in the order they were written
+    data_cache.write_npz(os.path.join(
+        directory, f'{time.time_ns():020d}.{os.getpid()}.npz'), columns)
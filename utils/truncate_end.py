@@ -5,7 +5,7 @@ import numpy as np
 import pandas as pd
 from colorlog import ColoredFormatter
 
-from utils.get_data_np import get_data
+from utils.get_data_np import complete_length, get_data
 
 # logger setup
 from utils.loggers import MyLog
@@ -21,24 +21,10 @@ def truncate_last_line(f: str):
     :param f: absolute path to the input raw file
     :return: None
     """
-    with open(f, 'r+') as file:
-        file.seek(0, os.SEEK_END)  # go to last byte of the file
-        ll = file.tell()
-        print(f'll = {ll}')
-        file.seek(file.tell() - 154, os.SEEK_SET)  # go 154 chars back
-        temp_str = file.read(2)  # read 2 chars from there
-
-        if '\n' in temp_str:
-            pass
-        else:
-            file.seek(0, os.SEEK_END)
-            pos = file.tell()
-            while file.read(1) != '\n':
-                pos -= 1
-                file.seek(pos, os.SEEK_SET)
-
-            file.seek(pos, os.SEEK_SET)
-            file.truncate()
+    length = complete_length(f)
+    if length < os.path.getsize(f):
+        with open(f, 'r+') as file:
+            file.truncate(length)
 
 
 def truncate_ground(input_file: str, delta: float = 1., time_diff: float = 5.):
@@ -55,17 +41,14 @@ def truncate_ground(input_file: str, delta: float = 1., time_diff: float = 5.):
     :return: trimmed array containing time, wz, Nz; original data containing
      time, wz, Nz; running average array of wz
     """
-    # read data
-    cols = list(range(2, 8))
-    data = get_data(input_file, cols)
+    # read time, wz and Nz only
+    data = get_data(input_file, [4, 7])
 
     # convert data into an array
-    arr = np.array(data[0])
-    for i in range(1, len(data)):
-        arr = np.c_[arr, data[i]]
+    arr = np.c_[data[0], data[1], data[2]]
 
     # running average of the wz
-    df = pd.Series(arr[:, 3])
+    df = pd.Series(arr[:, 1])
     running_mean = df.rolling(10).mean()
     running_mean.fillna(0, inplace=True)  # pad the running average with zeros
 
@@ -83,7 +66,7 @@ def truncate_ground(input_file: str, delta: float = 1., time_diff: float = 5.):
             break
     logger.info(f'Tail cutoff index is {j}')
 
-    return arr[i:j, [0, 3, 6]], [data[k] for k in [0, 3, 6]], running_mean
+    return arr[i:j], data, running_mean
 
 
 if __name__ == '__main__':
@@ -30,17 +30,14 @@ def truncate_ground(input_file: str, delta: float = 1.,
      cut off
     """
 
-    # read data
-    cols = list(range(2, 8))
-    data = get_data(input_file, cols)
+    # read time and wz only
+    data = get_data(input_file, [4])
 
     # convert data into an array
-    arr = np.array(data[0])
-    for head_ix in range(1, len(data)):
-        arr = np.c_[arr, data[head_ix]]
+    arr = np.c_[data[0], data[1]]
 
     # running average of the wz
-    df = pd.Series(arr[:, 3])
+    df = pd.Series(arr[:, 1])
     running_mean = df.rolling(10).mean()
     running_mean.fillna(0, inplace=True)  # fill in the blanks with zeros
 
@@ -0,0 +1,124 @@
+"""
+Validation of IMU recordings while they are being read.
+
+The rules are checked on every chunk decoded by ``get_data_np.iter_data``,
+so reading a flight stops at the first chunk which breaks one of them,
+instead of parsing, counting and only then discarding the whole file.
+"""
+import numpy as np
+
+# column of the vertical acceleration, Nz, in the IMU records
+NZ_COLUMN = 7
+
+
+class FlightRejected(Exception):
+    def __init__(self, rule: str, reason: str):
+        """
+        Raised when an IMU recording breaks a validation rule.
+
+        :param rule: str Name of the broken rule, e.g. ``'max_nz'``.
+        :param reason: str Human readable description of the failure.
+        """
+        super().__init__(rule, reason)  # both, so that it can be pickled
+        self.rule = rule
+        self.reason = reason
+
+    def __str__(self):
+        return self.reason
+
+
+class ValidationRules:
+    def __init__(self, max_nz=3.5, min_nz=None, max_gap=None,
+                 saturation_level=None, saturation_run=None,
+                 nz_col=NZ_COLUMN):
+        """
+        Hard rules a recording must satisfy to be analyzed. A rule set to
+        ``None`` is not checked. Recordings with NaN values are always
+        rejected, and so are the ones which cannot be parsed (see
+        ``get_data_np.get_data``).
+
+        :param max_nz: float Highest acceptable Nz in g.
+        :param min_nz: float Lowest acceptable Nz in g.
+        :param max_gap: float Longest acceptable time between consecutive
+         records in seconds. Timestamps going backwards are rejected too.
+        :param saturation_level: float Nz magnitude, in g, at which the
+         sensor saturates.
+        :param saturation_run: int Number of consecutive samples at or
+         beyond ``saturation_level`` which rejects the recording.
+        :param nz_col: int Column of Nz in the IMU records.
+        """
+        self.max_nz = max_nz
+        self.min_nz = min_nz
+        self.max_gap = max_gap
+        self.saturation_level = saturation_level
+        self.saturation_run = saturation_run
+        self.nz_col = nz_col
+
+    def validate(self, chunks, col_list: list):
+        """
+        Checks the chunks of a recording as they are read and passes them
+        through. Gaps and saturation runs spanning two chunks are detected.
+
+        :param chunks: iterable of lists of 1D arrays, time in seconds
+         first, then ``col_list``, as yielded by ``iter_data``.
+        :param col_list: list Columns of the chunks, excluding the time.
+        :return: generator of the chunks.
+        :raises FlightRejected: at the first chunk breaking a rule.
+        """
+        nz_index = 1 + col_list.index(self.nz_col) \
+            if self.nz_col in col_list else None
+
+        last_time = None  # time of the last record of the previous chunk
+        run = 0  # saturated samples at the end of the previous chunk
+        for chunk in chunks:
+            for col, values in zip(['time'] + col_list, chunk):
+                if np.isnan(values).any():
+                    raise FlightRejected(
+                        'nan', f'column {col} contains NaN values')
+
+            if self.max_gap is not None and len(chunk[0]):
+                seconds = chunk[0] if last_time is None \
+                    else np.r_[last_time, chunk[0]]
+                gaps = np.diff(seconds)
+                if len(gaps) and gaps.min() < 0:
+                    raise FlightRejected('max_gap',
+                                         'timestamps are not increasing')
+                if len(gaps) and gaps.max() > self.max_gap:
+                    raise FlightRejected(
+                        'max_gap', f'{gaps.max():.3f} s between records')
+                last_time = chunk[0][-1]
+
+            if nz_index is not None and len(chunk[nz_index]):
+                run = self._check_nz(chunk[nz_index], run)
+
+            yield chunk
+
+    def _check_nz(self, nz: np.ndarray, run: int) -> int:
+        """
+        Checks the Nz rules on a chunk and returns the number of saturated
+        samples at its end.
+        """
+        if self.max_nz is not None and nz.max() > self.max_nz:
+            raise FlightRejected(
+                'max_nz', f'Nz of {nz.max():g} g, higher than '
+                          f'{self.max_nz:g} g')
+        if self.min_nz is not None and nz.min() < self.min_nz:
+            raise FlightRejected(
+                'min_nz', f'Nz of {nz.min():g} g, lower than '
+                          f'{self.min_nz:g} g')
+
+        if self.saturation_level is None or self.saturation_run is None:
+            return 0
+
+        saturated = np.abs(nz) >= self.saturation_level
+        # start and end of the runs of saturated samples
+        edges = np.flatnonzero(np.diff(np.r_[False, saturated, False]))
+        lengths = edges[1::2] - edges[::2]
+        if len(lengths) and edges[0] == 0:  # continues the previous run
+            lengths[0] += run
+        if len(lengths) and lengths.max() >= self.saturation_run:
+            raise FlightRejected(
+                'saturation', f'{lengths.max()} consecutive samples at or '
+                              f'beyond {self.saturation_level:g} g')
+
+        return int(lengths[-1]) if saturated[-1] else 0